@@ -0,0 +1,213 @@
+"""
+HashProof Results Analytics
+Append-only JSONL log of graded results, paged export, and incrementally maintained aggregates
+"""
+
+import os
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+import orjson
+from question_models import StoredTest
+
+GRADES = ("A", "B", "C", "D", "F")
+PASS_THRESHOLD = 0.7
+SCORE_BUCKETS = 10  # histogram of overall_score in 0.1-wide buckets
+CURSOR_RECORD = "__log_offset__"  # snapshot key holding how much of the log the aggregates cover
+
+def letter_grade(score: float) -> str:
+    return "A" if score >= 0.9 else "B" if score >= 0.8 else "C" if score >= PASS_THRESHOLD else "D" if score >= 0.6 else "F"
+
+class Aggregate:
+    """Running score statistics for one slice of results, O(1) to update and to read"""
+
+    __slots__ = ("count", "passed", "score_sum", "score_sq_sum", "min_score", "max_score", "grades", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.passed = 0
+        self.score_sum = 0.0
+        self.score_sq_sum = 0.0
+        self.min_score = None
+        self.max_score = None
+        self.grades = {g: 0 for g in GRADES}
+        self.histogram = [0] * SCORE_BUCKETS
+
+    def add(self, score: float, passed: bool, grade: str):
+        self.count += 1
+        self.passed += int(passed)
+        self.score_sum += score
+        self.score_sq_sum += score * score
+        self.min_score = score if self.min_score is None else min(self.min_score, score)
+        self.max_score = score if self.max_score is None else max(self.max_score, score)
+        self.grades[grade] = self.grades.get(grade, 0) + 1
+        self.histogram[min(SCORE_BUCKETS - 1, int(score * SCORE_BUCKETS))] += 1
+
+    def to_state(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "Aggregate":
+        agg = cls()
+        for name in cls.__slots__:
+            setattr(agg, name, state[name])
+        return agg
+
+    def summary(self) -> Dict:
+        mean = self.score_sum / self.count if self.count else 0.0
+        variance = max(0.0, self.score_sq_sum / self.count - mean * mean) if self.count else 0.0
+        return {
+            "results": self.count,
+            "pass_rate": round(self.passed / self.count, 3) if self.count else 0.0,
+            "mean_score": round(mean, 3),
+            "stddev_score": round(variance ** 0.5, 3),
+            "min_score": self.min_score,
+            "max_score": self.max_score,
+            "grades": self.grades,
+            "score_histogram": self.histogram,
+        }
+
+class ResultsLog:
+    """Graded results, appended to a local JSONL file and folded into per test/topic/difficulty aggregates"""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.aggregates: Dict[Tuple[str, str], Aggregate] = {}
+        self.covered_offset = 0  # log bytes already folded into the aggregates
+
+    def open(self, path: str):
+        if self.path == path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+
+    def _slices(self, entry: Dict) -> List[Tuple[str, str]]:
+        return [
+            ("all", "all"),
+            ("test", entry.get("base_test_id", entry["test_id"])),  # variants count towards their base test
+            ("topic", entry["topic"]),
+            ("difficulty", entry["difficulty"]),
+            ("topic_difficulty", f"{entry['topic']}|{entry['difficulty']}"),
+        ]
+
+    def _fold(self, entry: Dict):
+        for key in self._slices(entry):
+            agg = self.aggregates.get(key)
+            if agg is None:
+                agg = self.aggregates[key] = Aggregate()
+            agg.add(entry["overall_score"], entry["passed"], entry["grade"])
+
+    def record(self, test_data: StoredTest, result: Dict) -> Dict:
+        """Append a graded result and update the aggregates; tags `result` with its result_id"""
+        if self.path is None:
+            self.open(os.getenv("RESULTS_LOG_PATH", "results/graded_results.jsonl"))
+        result["result_id"] = str(uuid.uuid4())
+        entry = dict(result, topic=test_data.topic, difficulty=test_data.difficulty, recorded_at=time.time())
+        line = orjson.dumps(entry) + b"\n"
+
+        # O_APPEND keeps each line intact even when several workers share the file
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            end = os.lseek(fd, 0, os.SEEK_CUR)
+        finally:
+            os.close(fd)
+
+        # Lines other workers appended since we last looked sit before ours: fold them first so
+        # covered_offset never skips past results this worker has not counted
+        self._fold_through(end - len(line))
+        self._fold(entry)
+        self.covered_offset = end
+        return result
+
+    def read_page(self, cursor: int, limit: int, topic: Optional[str] = None,
+                  test_id: Optional[str] = None) -> Tuple[List[bytes], Optional[int]]:
+        """Up to `limit` log lines starting at byte offset `cursor`; returns (lines, next_cursor or None at EOF).
+
+        Raises ValueError if `cursor` is not the start of a line (i.e. not 0 or a returned next_cursor).
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return [], None
+        lines = []
+        with open(self.path, "rb") as f:
+            if cursor > 0:
+                f.seek(cursor - 1)
+                if f.read(1) != b"\n":
+                    raise ValueError("Cursor is not at the start of a result line")
+            f.seek(cursor)
+            while len(lines) < limit:
+                line = f.readline()
+                if not line:
+                    return lines, None
+                if not line.endswith(b"\n"):
+                    return lines, None  # a write in progress; pick it up next page
+                if topic or test_id:
+                    entry = orjson.loads(line)
+                    if (topic and entry.get("topic") != topic) or \
+                            (test_id and test_id not in (entry.get("test_id"), entry.get("base_test_id"))):
+                        continue
+                lines.append(line)
+            return lines, f.tell()
+
+    def summary(self, dimension: str = "all", key: str = "all") -> Optional[Dict]:
+        agg = self.aggregates.get((dimension, key))
+        return agg.summary() if agg else None
+
+    def breakdown(self, dimension: str) -> Dict[str, Dict]:
+        return {key: agg.summary() for (dim, key), agg in self.aggregates.items() if dim == dimension}
+
+    def dump_snapshot(self) -> Iterable[Tuple[str, bytes]]:
+        for (dimension, key), agg in self.aggregates.items():
+            yield f"{dimension}:{key}", orjson.dumps(agg.to_state())
+        yield CURSOR_RECORD, orjson.dumps({"path": self.path, "offset": self.covered_offset})
+
+    def load_snapshot(self, snapshot, namespace: str):
+        """Restore aggregates and the log offset they cover; catch_up() folds in the rest"""
+        if self.aggregates:
+            return
+        cursor = None
+        for key in snapshot.keys(namespace):
+            try:
+                state = orjson.loads(snapshot.read(namespace, key))
+            except Exception as e:
+                print(f"⚠️  Skipping analytics record {key}: {e}")
+                continue
+            if key == CURSOR_RECORD:
+                cursor = state
+                continue
+            dimension, _, slice_key = key.partition(":")
+            self.aggregates[(dimension, slice_key)] = Aggregate.from_state(state)
+        if cursor and cursor["path"] == self.path:
+            self.covered_offset = cursor["offset"]
+        else:
+            # Aggregates of a different log cannot be extended safely: rebuild from this one
+            self.aggregates = {}
+            self.covered_offset = 0
+
+    def catch_up(self):
+        """Fold log lines not yet covered by the aggregates (tail after the last snapshot, or a cold start)"""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        folded = self._fold_through()
+        if folded:
+            print(f"📊 Folded {folded} logged results into analytics")
+
+    def _fold_through(self, end: Optional[int] = None) -> int:
+        """Fold complete log lines from covered_offset up to byte `end` (default: end of file); returns how many"""
+        if end is not None and end <= self.covered_offset:
+            return 0
+        folded = 0
+        with open(self.path, "rb") as f:
+            f.seek(self.covered_offset)
+            for line in f:
+                if not line.endswith(b"\n") or (end is not None and self.covered_offset + len(line) > end):
+                    break
+                try:
+                    self._fold(orjson.loads(line))
+                    folded += 1
+                except (orjson.JSONDecodeError, KeyError) as e:
+                    print(f"⚠️  Skipping unreadable results log line at {self.covered_offset}: {e}")
+                self.covered_offset += len(line)
+        return folded
+
+RESULTS = ResultsLog()
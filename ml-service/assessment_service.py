@@ -0,0 +1,31 @@
+"""
+HashProof Assessment System
+Combined MCQ and code assessment app: both routers in one process, sharing one AI client
+connection pool, test store, snapshot, metrics and usage tracking
+"""
+
+import os
+import mcq_service
+import code_assesment_service
+from service_app import build_app
+
+# FASTAPI APP
+app = build_app(
+    title="HashProof Assessment System",
+    description="AI-powered MCQ and coding assessment system using DeepSeek",
+    service_type="Combined Assessment",
+    features=mcq_service.FEATURES + code_assesment_service.FEATURES,
+    routers=[mcq_service.router, code_assesment_service.router],
+    snapshot_name="assessment_service",
+    snapshot_components={
+        "item_bank": mcq_service.ITEM_BANK,
+        "grading_cache": code_assesment_service.GRADING_CACHE,
+        "verifications": code_assesment_service.VERIFICATIONS,
+        "code_bank": code_assesment_service.CODE_BANK
+    }
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 8000))
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
@@ -0,0 +1,70 @@
+"""
+HashProof Bulk Generation
+Builds a whole cohort of distinct tests from one shared question pool
+"""
+
+import math
+import random
+from typing import Any, Callable, Iterable, Iterator, List
+from question_models import StoredTest
+
+# CONFIGURATION
+MAX_COHORT_SIZE = 500
+POOL_FACTOR = 2  # pool holds this many questions per question in a test
+MAX_DRAW_ATTEMPTS = 20
+
+def pool_target(question_count: int) -> int:
+    return question_count * POOL_FACTOR
+
+def generation_batches(missing: int, per_call: int) -> List[int]:
+    """Split `missing` questions into the fewest upstream calls of at most `per_call` questions"""
+    if missing <= 0:
+        return []
+    calls = math.ceil(missing / per_call)
+    base, extra = divmod(missing, calls)
+    return [base + (1 if i < extra else 0) for i in range(calls)]
+
+def dedupe(questions: Iterable[Any], key: Callable[[Any], str]) -> List[Any]:
+    seen = set()
+    unique = []
+    for q in questions:
+        k = key(q)
+        if k not in seen:
+            seen.add(k)
+            unique.append(q)
+    return unique
+
+def compose_cohort(pool: List[Any], question_count: int, cohort_size: int,
+                   build: Callable[[List[Any]], StoredTest]) -> List[StoredTest]:
+    """Draw one question selection per student from `pool` and build a test from each.
+
+    Selections are distinct as sets while the pool allows it, then distinct by order;
+    a pool too small for either still yields `cohort_size` tests.
+    """
+    count = min(question_count, len(pool))
+    seen_sets, seen_orders = set(), set()
+    tests = []
+    for _ in range(cohort_size):
+        picked = None
+        for _ in range(MAX_DRAW_ATTEMPTS):
+            indices = random.sample(range(len(pool)), count)
+            if frozenset(indices) not in seen_sets:
+                picked = indices
+                break
+        if picked is None:
+            for _ in range(MAX_DRAW_ATTEMPTS):
+                indices = random.sample(range(len(pool)), count)
+                if tuple(indices) not in seen_orders:
+                    picked = indices
+                    break
+        if picked is None:
+            picked = indices
+        seen_sets.add(frozenset(picked))
+        seen_orders.add(tuple(picked))
+        tests.append(build([pool[i] for i in picked]))
+    return tests
+
+def stream_tests(tests: List[StoredTest]) -> Iterator[bytes]:
+    """NDJSON body: one test payload per line"""
+    for test in tests:
+        yield test.payload + b"\n"
@@ -0,0 +1,45 @@
+"""
+HashProof Code Question Bank
+Generated code questions kept per topic and difficulty, so cohort pools reuse them before asking the AI for more
+"""
+
+import hashlib
+import os
+import random
+from typing import List
+import orjson
+from question_models import CodeQuestion
+from snapshot_lru import SnapshotLRU
+
+# CONFIGURATION
+CODE_BANK_SIZE = int(os.getenv("CODE_BANK_SIZE", "2000"))
+
+def _encode(question: CodeQuestion) -> bytes:
+    return orjson.dumps(question.to_dict())
+
+def _decode(record: bytes) -> CodeQuestion:
+    return CodeQuestion.from_dict(orjson.loads(record))
+
+class CodeBank(SnapshotLRU[CodeQuestion]):
+    """Generated code questions keyed `<topic>/<difficulty>/<question hash>`; the least recently drawn go first"""
+
+    def __init__(self, max_entries: int = CODE_BANK_SIZE):
+        super().__init__(max_entries, encode=_encode, decode=_decode, metric="code_bank")
+
+    @staticmethod
+    def _prefix(topic: str, difficulty: str) -> str:
+        return f"{topic.lower()}/{difficulty}/"
+
+    def add(self, topic: str, difficulty: str, questions: List[CodeQuestion]):
+        prefix = self._prefix(topic, difficulty)
+        for question in questions:
+            self.put(prefix + hashlib.sha256(question.question.encode()).hexdigest()[:16], question)
+
+    def sample(self, topic: str, difficulty: str, count: int) -> List[CodeQuestion]:
+        """Up to `count` distinct banked questions for the topic and difficulty, in random order"""
+        prefix = self._prefix(topic, difficulty)
+        keys = [key for key in self.keys() if key.startswith(prefix)]
+        picked = (self.get(key) for key in random.sample(keys, min(count, len(keys))))
+        return [question for question in picked if question is not None]
+
+CODE_BANK = CodeBank()
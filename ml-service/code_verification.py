@@ -0,0 +1,324 @@
+"""
+HashProof Code Verification
+Runs generated reference solutions against their test cases at generation time, each in a throwaway
+network-less namespace sandbox, so questions whose expected outputs the solution does not reproduce
+never reach students
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+import orjson
+from metrics import METRICS
+from question_models import CodeQuestion
+from snapshot_lru import SnapshotLRU
+
+# CONFIGURATION
+VERIFY_CODE_QUESTIONS = os.getenv("VERIFY_CODE_QUESTIONS", "1") == "1"
+VERIFY_SANDBOX = os.getenv("VERIFY_SANDBOX", "namespaces").lower()  # namespaces, or none (unsafe: full host access)
+VERIFY_CONCURRENCY = int(os.getenv("VERIFY_CONCURRENCY", str(os.cpu_count() or 2)))
+VERIFY_TIMEOUT_SECONDS = float(os.getenv("VERIFY_TIMEOUT_SECONDS", "5"))  # per question, all of its cases
+VERIFY_MEMORY_MB = int(os.getenv("VERIFY_MEMORY_MB", "256"))
+VERIFICATION_CACHE_SIZE = int(os.getenv("VERIFICATION_CACHE_SIZE", "5000"))
+MAX_OUTPUT_BYTES = 256 * 1024
+MAX_FILE_BYTES = 1 << 20
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+SANDBOX_SYSTEM_PATHS = ("/usr", "/bin", "/lib", "/lib64", "/lib32")  # bound read-only; runner prefixes are added
+SANDBOX_SETUP_FAILED = 125  # exit code of SANDBOX_SETUP when it could not build the sandbox
+TOOL_PATH = "/usr/sbin:/usr/bin:/sbin:/bin"
+
+# Each harness reads {"solution", "cases", "timeout_ms"} on stdin, evaluates every case's `input` (a call
+# expression) after the solution, compares it with `expected` (a literal, else its printed form) and writes
+# {"cases": [{"ok", "error"?}]} or {"error", "exception"} as its only output. Nothing the solution prints or
+# returns is passed back, only pass/fail and exception type names.
+PYTHON_HARNESS = r"""
+import ast, io, json, sys
+job = json.loads(sys.stdin.read())
+out = sys.stdout
+sys.stdout = sys.stderr = io.StringIO()
+
+def parse(text):
+    for load in (ast.literal_eval, json.loads):
+        try:
+            return load(text)
+        except Exception:
+            pass
+    return text
+
+def check(case, ns):
+    try:
+        actual = eval(case["input"], ns)
+    except BaseException as e:
+        return {"ok": False, "error": type(e).__name__}
+    expected = parse(case["expected"])
+    try:
+        ok = bool(actual == expected) or (isinstance(expected, str) and expected in (str(actual), repr(actual)))
+    except BaseException:
+        ok = False
+    return {"ok": ok}
+
+ns = {"__name__": "__solution__"}
+try:
+    exec(job["solution"], ns)
+except BaseException as e:
+    out.write(json.dumps({"error": "solution does not run", "exception": type(e).__name__}))
+else:
+    out.write(json.dumps({"cases": [check(case, ns) for case in job["cases"]]}))
+"""
+
+JAVASCRIPT_HARNESS = r"""
+const vm = require('vm');
+const util = require('util');
+let data = '';
+process.stdin.on('data', chunk => data += chunk).on('end', () => {
+  const job = JSON.parse(data);
+  const quiet = () => {};
+  const ctx = vm.createContext({console: {log: quiet, error: quiet, warn: quiet, info: quiet}});
+  const run = code => vm.runInContext(code, ctx, {timeout: job.timeout_ms});
+  const write = result => process.stdout.write(JSON.stringify(result));
+  const parse = text => { try { return run('(' + text + ')'); } catch (e) { return text; } };
+  const name = e => { try { return String((e && e.name) || typeof e); } catch (_) { return 'Error'; } };
+  try {
+    run(job.solution);
+  } catch (e) {
+    return write({error: 'solution does not run', exception: name(e)});
+  }
+  write({cases: job.cases.map(c => {
+    let actual;
+    try { actual = run(c.input); } catch (e) { return {ok: false, error: name(e)}; }
+    const expected = parse(c.expected);
+    let ok;
+    try { ok = util.isDeepStrictEqual(actual, expected) || (typeof expected === 'string' && String(actual) === expected); }
+    catch (e) { ok = false; }
+    return {ok};
+  })});
+});
+"""
+
+# Runs as root of fresh user, mount, pid and network namespaces (so root only over them): builds a tmpfs
+# root holding read-only binds of the runtime paths and nothing else (no service code, config or .env),
+# then chroots into it. Arguments: root directory, colon-separated bind paths, command.
+SANDBOX_SETUP = r"""
+root=$1; binds=$2; shift 2
+mount -t tmpfs -o size=16m,mode=755 sandbox "$root" || exit 125
+IFS=:
+for path in $binds; do
+  if [ -L "$path" ]; then
+    mkdir -p "$root$(dirname "$path")" && ln -s "$(readlink "$path")" "$root$path" || exit 125
+  elif [ -d "$path" ]; then
+    mkdir -p "$root$path" && mount --bind "$path" "$root$path" && mount -o remount,bind,ro "$root$path" || exit 125
+  fi
+done
+unset IFS
+mkdir -p "$root/dev" "$root/proc" "$root/tmp" || exit 125
+for dev in null zero urandom; do
+  touch "$root/dev/$dev" && mount --bind "/dev/$dev" "$root/dev/$dev" || exit 125
+done
+mount -t proc proc "$root/proc" || exit 125
+exec /usr/sbin/chroot "$root" "$@"
+"""
+
+def _python_command() -> Optional[List[str]]:
+    return [os.path.realpath(getattr(sys, "_base_executable", sys.executable)), "-I", "-S", "-c", PYTHON_HARNESS]
+
+def _node_command() -> Optional[List[str]]:
+    node = shutil.which("node")
+    return [os.path.realpath(node), f"--max-old-space-size={VERIFY_MEMORY_MB}", "-e", JAVASCRIPT_HARNESS] if node else None
+
+# topic -> (command factory, whether RLIMIT_AS can be applied; V8 reserves far more address space than it uses)
+RUNNERS = {
+    "Python": (_python_command, True),
+    "JavaScript": (_node_command, False),
+}
+
+class SandboxUnavailable(Exception):
+    """Verification cannot run safely here; questions are kept unverified instead of being judged"""
+
+def _within(path: str, directory: str) -> bool:
+    return path == directory or path.startswith(directory.rstrip("/") + "/")
+
+def _tool(name: str) -> str:
+    path = shutil.which(name, path=TOOL_PATH)
+    if path is None:
+        raise SandboxUnavailable(f"{name} not found")
+    return path
+
+def _limits(limit_memory: bool) -> List[str]:
+    """prlimit caps: CPU seconds, largest writable file, no core dumps, address space where the runtime allows"""
+    cpu = int(VERIFY_TIMEOUT_SECONDS) + 1
+    limits = [f"--cpu={cpu}", f"--fsize={MAX_FILE_BYTES}", "--core=0"]
+    if limit_memory:
+        limits.append(f"--as={VERIFY_MEMORY_MB * 1024 * 1024}")
+    return [_tool("prlimit"), *limits, "--"]
+
+def _sandbox_command(command: List[str], limit_memory: bool, root: str) -> List[str]:
+    """`command` wrapped per VERIFY_SANDBOX; raises SandboxUnavailable rather than run it with less isolation"""
+    if VERIFY_SANDBOX == "none":
+        return _limits(limit_memory) + command
+    if VERIFY_SANDBOX != "namespaces":
+        raise SandboxUnavailable(f"unknown VERIFY_SANDBOX {VERIFY_SANDBOX!r}")
+
+    setpriv, limits = _tool("setpriv"), _limits(limit_memory)
+    # Dropping the bounding set leaves the namespace root without capabilities, so it cannot remount the binds rw
+    wrapped = [setpriv, "--bounding-set=-all", "--inh-caps=-all", "--no-new-privs", "--"] + limits + command
+    binds = list(SANDBOX_SYSTEM_PATHS)
+    for executable in (setpriv, limits[0], command[0]):
+        if not any(_within(executable, path) for path in binds):
+            binds.append(os.path.dirname(os.path.dirname(executable)))  # the runtime's install prefix
+    exposed = [path for path in binds if _within(SERVICE_DIR, path)]
+    if exposed:
+        raise SandboxUnavailable(f"refusing to expose the service directory through {exposed[0]}")
+    if not os.path.exists("/usr/sbin/chroot"):
+        raise SandboxUnavailable("/usr/sbin/chroot not found")
+    return [
+        _tool("unshare"), "--user", "--map-root-user", "--net", "--mount", "--pid", "--fork", "--kill-child",
+        "--ipc", "--uts", "--", "/bin/sh", "-c", SANDBOX_SETUP, "sandbox", root, ":".join(binds), *wrapped
+    ]
+
+class VerificationCache(SnapshotLRU[Dict]):
+    """Bounded LRU of verification outcomes by language, solution and test cases"""
+
+    def __init__(self, max_entries: int = VERIFICATION_CACHE_SIZE):
+        super().__init__(max_entries, encode=orjson.dumps, decode=orjson.loads, metric="verification_cache")
+
+    @staticmethod
+    def key(topic: str, solution: str, test_cases: List[Dict]) -> str:
+        h = hashlib.sha256(topic.encode())
+        h.update(b"\0")
+        h.update(solution.encode())
+        h.update(b"\0")
+        h.update(orjson.dumps(test_cases, option=orjson.OPT_SORT_KEYS))
+        return h.hexdigest()
+
+VERIFICATIONS = VerificationCache()
+_SANDBOX_SLOTS = asyncio.Semaphore(VERIFY_CONCURRENCY)
+
+async def _run_sandboxed(command: List[str], limit_memory: bool, job: bytes) -> Dict:
+    """Run one harness in the sandbox with an empty environment; {"error"} on timeout or crash"""
+    async with _SANDBOX_SLOTS:
+        root = tempfile.mkdtemp(prefix="hashproof-verify-")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *_sandbox_command(command, limit_memory, root),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                cwd=root,
+                env={"PATH": os.defpath, "HOME": "/tmp", "TMPDIR": "/tmp"},
+                start_new_session=True  # own process group, killed as a whole on timeout
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(job), timeout=VERIFY_TIMEOUT_SECONDS)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                return {"error": f"timed out after {VERIFY_TIMEOUT_SECONDS:.0f}s", "transient": True}
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if process.returncode == SANDBOX_SETUP_FAILED and not stdout:
+        raise SandboxUnavailable("could not set up the sandbox (are unprivileged user namespaces enabled?)")
+    if len(stdout) > MAX_OUTPUT_BYTES:
+        return {"error": "harness output too large"}
+    try:
+        output = orjson.loads(stdout)
+    except orjson.JSONDecodeError:
+        output = None
+    # The solution shares the harness process and could print anything, so only known shapes are passed on
+    if isinstance(output, dict) and isinstance(output.get("cases"), list):
+        return {"cases": [_case_result(case) for case in output["cases"]]}
+    if isinstance(output, dict) and "error" in output:
+        return {"error": f"solution does not run ({_exception_name(output.get('exception'))})"}
+    return {"error": f"solution crashed (exit code {process.returncode})"}
+
+_EXCEPTION_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,63}")
+
+def _exception_name(value) -> str:
+    """An exception type name reported by a harness, or a generic one: no text chosen by the solution is logged"""
+    return value if isinstance(value, str) and _EXCEPTION_NAME.fullmatch(value) else "exception"
+
+def _case_result(case) -> Dict:
+    if isinstance(case, dict) and case.get("ok") is True:
+        return {"ok": True}
+    if isinstance(case, dict) and "error" in case:
+        return {"ok": False, "error": _exception_name(case["error"])}
+    return {"ok": False}
+
+async def verify_question(topic: str, question: CodeQuestion) -> Dict:
+    """Outcome for one question: {"status": "passed" | "failed" | "unsupported", ...}, cached by content.
+
+    Reasons name case positions and exception types only, never the solution's output or messages.
+    """
+    runner = RUNNERS.get(topic)
+    command = runner[0]() if runner else None
+    if command is None:
+        return {"status": "unsupported", "reason": f"no sandbox runner for {topic}"}
+
+    key = VERIFICATIONS.key(topic, question.solution, question.test_cases)
+    cached = VERIFICATIONS.get(key)
+    if cached is not None:
+        return cached
+
+    job = orjson.dumps({
+        "solution": question.solution,
+        "cases": question.test_cases,
+        "timeout_ms": int(VERIFY_TIMEOUT_SECONDS * 1000)
+    })
+    try:
+        output = await _run_sandboxed(command, runner[1], job)
+    except SandboxUnavailable as e:
+        return {"status": "unsupported", "reason": f"sandbox unavailable: {e}"}  # not the question's fault; not cached
+    except (OSError, subprocess.SubprocessError) as e:
+        return {"status": "unsupported", "reason": f"sandbox unavailable: {type(e).__name__}"}
+
+    if "error" in output:
+        outcome = {"status": "failed", "reason": output["error"]}
+    else:
+        cases = output["cases"]
+        failed = [i for i, case in enumerate(cases) if not case["ok"]]
+        outcome = {"status": "failed" if failed or not cases else "passed", "cases": cases}
+        if failed:
+            first = cases[failed[0]]
+            outcome["reason"] = f"{len(failed)}/{len(cases)} test cases fail, first case {failed[0] + 1} " \
+                                f"({first.get('error', 'wrong result')})"
+        elif not cases:
+            outcome["reason"] = "no test case results"
+    if not output.get("transient"):  # a timeout may just be a loaded host; let a later duplicate try again
+        VERIFICATIONS.put(key, outcome)
+    return outcome
+
+async def verify_code_questions(topic: str, questions: List[CodeQuestion]) -> List[CodeQuestion]:
+    """Questions whose reference solution passes all its test cases, marked verified, run concurrently.
+
+    Failing questions are dropped (the generation repair loop asks for replacements); languages with no
+    runner, and every language when the sandbox cannot be set up, are kept unverified.
+    """
+    if not VERIFY_CODE_QUESTIONS or not questions:
+        return questions
+    outcomes = await asyncio.gather(*(verify_question(topic, q) for q in questions))
+
+    kept = []
+    for question, outcome in zip(questions, outcomes):
+        METRICS.incr(f"code_verification_{outcome['status']}")
+        if outcome["status"] == "passed":
+            kept.append(question.copy(verified=True))
+        elif outcome["status"] == "unsupported":
+            kept.append(question)
+        else:
+            print(f"⚠️  Dropping code question {question.id}: {outcome['reason']}")
+    passed = sum(1 for q in kept if q.verified)
+    if passed:
+        print(f"✅ Verified {passed}/{len(questions)} {topic} reference solutions against their test cases")
+    return kept
@@ -0,0 +1,29 @@
+"""
+HashProof Configuration
+Environment-driven settings shared by every module; importing this loads .env first
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# AI PROVIDER
+DEEPSEEK_BASE_URL = "https://router.huggingface.co/v1"
+MODEL = "deepseek-ai/DeepSeek-R1:novita"
+
+# UPSTREAM QUOTAS (0 = not limited locally)
+UPSTREAM_RPM = float(os.getenv("UPSTREAM_RPM", "0"))  # set to the provider's quota; queued calls share the grading deadline
+UPSTREAM_TPM = float(os.getenv("UPSTREAM_TPM", "0"))
+LLM_CALL_DEADLINE_SECONDS = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "60"))  # queueing + retries + the call
+HEALTH_PROBE_DEADLINE_SECONDS = float(os.getenv("HEALTH_PROBE_DEADLINE_SECONDS", "5"))
+
+# DEBUG ENDPOINTS (disabled unless a token is set)
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+
+# SNAPSHOTS
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "60"))  # 0 = only on shutdown
+
+# TOKEN PRICING (per million tokens, for cost estimates only)
+PROMPT_PRICE_PER_MTOK = float(os.getenv("LLM_PROMPT_PRICE_PER_MTOK", "0"))
+COMPLETION_PRICE_PER_MTOK = float(os.getenv("LLM_COMPLETION_PRICE_PER_MTOK", "0"))
@@ -0,0 +1,60 @@
+"""
+HashProof Disconnect Handling
+Cancels upstream AI work tied to a request once its client has gone away
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Optional, Set
+from fastapi import HTTPException, Request
+from metrics import METRICS
+
+DISCONNECT_POLL_SECONDS = 0.5
+
+# Detached tasks are referenced here until they finish so they are not garbage collected mid-flight
+_DETACHED: Set[asyncio.Task] = set()
+
+class ClientDisconnected(HTTPException):
+    """Raised in place of a response when the client left; 499 is what proxies log for this case"""
+
+    def __init__(self):
+        super().__init__(status_code=499, detail="Client closed request")
+
+async def cancel_on_disconnect(request: Request, work: Awaitable, detach: bool = False,
+                               on_detached_result: Optional[Callable[[Any], None]] = None) -> Any:
+    """Await `work`, but stop waiting as soon as the client disconnects.
+
+    By default the work is cancelled, which aborts any in-flight `ask_ai` calls. With `detach=True`
+    the work keeps running in the background and `on_detached_result` receives its result, for
+    results that are worth keeping anyway (bank refills, cache entries).
+    """
+    task = asyncio.ensure_future(work)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            break
+
+    METRICS.incr("client_disconnects")
+    print(f"🔌 Client disconnected from {request.url.path}, {'detaching' if detach else 'cancelling'} work")
+
+    if detach:
+        METRICS.incr("work_detached")
+        _DETACHED.add(task)
+        task.add_done_callback(lambda t: _finish_detached(t, on_detached_result))
+    else:
+        METRICS.incr("work_cancelled")
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+    raise ClientDisconnected()
+
+def _finish_detached(task: asyncio.Task, on_result: Optional[Callable[[Any], None]]):
+    _DETACHED.discard(task)
+    if task.cancelled() or task.exception() is not None:
+        return
+    METRICS.incr("detached_results_kept")
+    if on_result:
+        on_result(task.result())
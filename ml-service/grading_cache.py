@@ -0,0 +1,28 @@
+"""
+HashProof Grading Cache
+AI grading responses keyed by prompt template version and graded content, so identical submissions are graded once
+"""
+
+import hashlib
+import os
+from prompts import PromptTemplate
+from snapshot_lru import SnapshotLRU
+
+# CONFIGURATION
+GRADING_CACHE_SIZE = int(os.getenv("GRADING_CACHE_SIZE", "5000"))
+
+class GradingCache(SnapshotLRU[str]):
+    """Bounded LRU of grading responses; a template change yields new keys, so stale grades are never served"""
+
+    def __init__(self, max_entries: int = GRADING_CACHE_SIZE):
+        super().__init__(max_entries, encode=str.encode, decode=bytes.decode, metric="grading_cache")
+
+    @staticmethod
+    def key(template: PromptTemplate, *parts: str) -> str:
+        h = hashlib.sha256(template.key.encode())
+        for part in parts:
+            h.update(b"\0")
+            h.update((part or "").encode())
+        return h.hexdigest()
+
+GRADING_CACHE = GradingCache()
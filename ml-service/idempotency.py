@@ -0,0 +1,148 @@
+"""
+HashProof Idempotent Grading
+Runs each grading request once per idempotency key: retries join the running grading or get the stored result
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+import orjson
+from fastapi import HTTPException
+from metrics import METRICS
+from snapshot import Record, Snapshot, SnapshotError
+
+# CONFIGURATION
+IDEMPOTENCY_RETENTION_SECONDS = float(os.getenv("IDEMPOTENCY_RETENTION_SECONDS", "3600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+def request_fingerprint(*parts: Any) -> str:
+    """Stable hash of a request's content; the default idempotency key"""
+    return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+class _Flight:
+    __slots__ = ("fingerprint", "task")
+
+    def __init__(self, fingerprint: str, task: asyncio.Task):
+        self.fingerprint = fingerprint
+        self.task = task
+
+class IdempotencyStore:
+    """In-flight gradings and completed results by idempotency key.
+
+    A duplicate of a running request awaits the same task; a duplicate of a completed one gets the
+    stored result for `retention` seconds. A grading runs to completion even when every caller has
+    disconnected, so the client's retry picks up its result instead of grading again. Failed
+    gradings and results with ungraded answers (default scores after an upstream timeout or error)
+    are not stored, so a retry grades again. Completed results are saved with the snapshot, keyed
+    `<expiry unix time>/<key>`, and decoded when their key is next used.
+    """
+
+    def __init__(self, retention: float = IDEMPOTENCY_RETENTION_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.retention = retention
+        self.max_entries = max_entries
+        self.in_flight: Dict[str, _Flight] = {}
+        self.completed: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()  # key -> (expires, fingerprint, result)
+        self._snapshot: Optional[Snapshot] = None
+        self._namespace = ""
+        self._lazy: Dict[str, str] = {}  # key -> snapshot key, for results not decoded yet
+
+    def _expire(self):
+        now = time.monotonic()
+        while self.completed:
+            key, (expires, _, _) = next(iter(self.completed.items()))
+            if expires > now and len(self.completed) + len(self._lazy) <= self.max_entries:
+                break
+            self.completed.popitem(last=False)
+        while self._lazy and len(self.completed) + len(self._lazy) > self.max_entries:
+            del self._lazy[next(iter(self._lazy))]
+
+    def _stored(self, key: str) -> Optional[Tuple[float, str, Any]]:
+        stored = self.completed.get(key)
+        if stored is None and key in self._lazy:
+            stored = self._load(key)
+        if stored is not None and stored[0] <= time.monotonic():
+            return None
+        return stored
+
+    def _load(self, key: str) -> Optional[Tuple[float, str, Any]]:
+        snapshot_key = self._lazy.pop(key)
+        try:
+            record = orjson.loads(self._snapshot.read(self._namespace, snapshot_key))
+            expires = time.monotonic() + float(snapshot_key.split("/", 1)[0]) - time.time()
+            stored = self.completed[key] = (expires, record["fingerprint"], record["result"])
+        except (SnapshotError, orjson.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            print(f"⚠️  Skipping stored grading {key}: {e}")
+            return None
+        return stored
+
+    def _settle(self, key: str, flight: _Flight):
+        if self.in_flight.get(key) is flight:
+            del self.in_flight[key]
+        task = flight.task
+        if task.cancelled() or task.exception() is not None or self.retention <= 0:
+            return
+        result = task.result()
+        if isinstance(result, dict) and result.get("ungraded_answers"):
+            METRICS.incr("idempotent_results_not_kept")
+            return
+        self.completed[key] = (time.monotonic() + self.retention, flight.fingerprint, result)
+        self._expire()
+
+    async def run(self, key: str, fingerprint: str, work: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of `work()` for `key`, running it only if no run for `key` is in flight or retained"""
+        self._expire()
+        stored = self._stored(key)
+        if stored is not None:
+            _check_fingerprint(stored[1], fingerprint)
+            METRICS.incr("idempotent_replays")
+            return stored[2]
+
+        flight = self.in_flight.get(key)
+        if flight is None:
+            flight = self.in_flight[key] = _Flight(fingerprint, asyncio.ensure_future(work()))
+            flight.task.add_done_callback(lambda _: self._settle(key, flight))
+        else:
+            _check_fingerprint(flight.fingerprint, fingerprint)
+            METRICS.incr("idempotent_joins")
+
+        # Shielded: a caller that is cancelled (client gone) stops waiting without stopping the grading
+        return await asyncio.shield(flight.task)
+
+    def __len__(self) -> int:
+        return len(self.completed) + len(self._lazy)
+
+    def dump_snapshot(self) -> Iterable[Tuple[str, Record]]:
+        self._expire()
+        now, wall = time.monotonic(), time.time()
+        for snapshot_key in self._lazy.values():
+            if float(snapshot_key.split("/", 1)[0]) > wall:
+                yield snapshot_key, self._snapshot.record(self._namespace, snapshot_key)
+        for key, (expires, fingerprint, result) in self.completed.items():
+            if expires > now:
+                yield f"{wall + expires - now:.3f}/{key}", orjson.dumps({"fingerprint": fingerprint, "result": result})
+
+    def load_snapshot(self, snapshot: Snapshot, namespace: str):
+        """Index unexpired results in `snapshot` by key; each is decoded when its key is next used"""
+        self._snapshot = snapshot
+        self._namespace = namespace
+        wall = time.time()
+        lazy = {}
+        for snapshot_key in snapshot.keys(namespace):
+            expiry, _, key = snapshot_key.partition("/")
+            try:
+                if float(expiry) > wall and key not in self.completed:
+                    lazy[key] = snapshot_key
+            except ValueError:
+                continue
+        self._lazy = lazy
+
+def _check_fingerprint(expected: str, fingerprint: str):
+    if expected != fingerprint:
+        METRICS.incr("idempotency_key_conflicts")
+        raise HTTPException(status_code=409, detail="Idempotency key was already used for a different grading request")
+
+# Shared by both graders; callers prefix keys with the test type
+GRADINGS = IdempotencyStore()
@@ -0,0 +1,290 @@
+"""
+HashProof Item Statistics
+Incrementally maintained per-question statistics and adaptive MCQ test assembly
+"""
+
+import hashlib
+import math
+import random
+from typing import List, Dict, Iterable, Optional, Tuple
+import orjson
+from question_models import MCQQuestion
+from snapshot import Record, Snapshot, SnapshotError
+
+# CONFIGURATION
+OPTION_KEYS = ("A", "B", "C", "D")
+MIN_RESPONSES_FOR_CALIBRATION = 20  # below this the nominal difficulty label is used
+DIFFICULTY_BANDS = ("easy", "medium", "hard")
+NOMINAL_BANDS = {"beginner": "easy", "intermediate": "medium", "advanced": "hard"}
+NOMINAL_P_VALUES = {"easy": 0.8, "medium": 0.55, "hard": 0.3}
+STUDENTS_RECORD = "__students__"  # snapshot key holding the per-student ability tallies
+
+def item_key(topic: str, question: MCQQuestion) -> str:
+    """Stable content key for a question, independent of the test it appeared in"""
+    options = question.options
+    raw = "|".join([topic.lower(), question.question] + [f"{k}={options.get(k, '')}" for k in OPTION_KEYS])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+def _logit(p: float) -> float:
+    p = min(0.99, max(0.01, p))
+    return math.log(p / (1 - p))
+
+class ItemStats:
+    """Running response statistics for one MCQ question, updated in O(1) per answer"""
+
+    __slots__ = ("key", "topic", "difficulty", "question", "responses", "correct",
+                 "sum_total", "sum_total_sq", "sum_total_correct", "option_counts")
+
+    def __init__(self, key: str, topic: str, difficulty: str, question: MCQQuestion):
+        self.key = key
+        self.topic = topic
+        self.difficulty = difficulty
+        self.question = question
+        self.responses = 0
+        self.correct = 0
+        self.sum_total = 0.0          # sum of the respondents' overall test scores
+        self.sum_total_sq = 0.0
+        self.sum_total_correct = 0.0  # same, restricted to respondents who got this item right
+        self.option_counts = {k: 0 for k in OPTION_KEYS}
+
+    def record(self, selected: str, is_correct: bool, total_score: float):
+        self.responses += 1
+        self.sum_total += total_score
+        self.sum_total_sq += total_score * total_score
+        if is_correct:
+            self.correct += 1
+            self.sum_total_correct += total_score
+        if selected in self.option_counts:
+            self.option_counts[selected] += 1
+
+    @property
+    def calibrated(self) -> bool:
+        return self.responses >= MIN_RESPONSES_FOR_CALIBRATION
+
+    @property
+    def p_value(self) -> float:
+        """Proportion of respondents answering correctly (classical item difficulty)"""
+        if not self.calibrated:
+            return NOMINAL_P_VALUES[NOMINAL_BANDS.get(self.difficulty, "medium")]
+        return self.correct / self.responses
+
+    @property
+    def discrimination(self) -> Optional[float]:
+        """Point-biserial correlation between answering correctly and overall test score"""
+        n, n1 = self.responses, self.correct
+        if n < 2 or n1 == 0 or n1 == n:
+            return None
+        mean = self.sum_total / n
+        variance = self.sum_total_sq / n - mean * mean
+        if variance <= 1e-12:
+            return None
+        mean_correct = self.sum_total_correct / n1
+        mean_incorrect = (self.sum_total - self.sum_total_correct) / (n - n1)
+        p = n1 / n
+        return (mean_correct - mean_incorrect) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+
+    @property
+    def band(self) -> str:
+        if not self.calibrated:
+            return NOMINAL_BANDS.get(self.difficulty, "medium")
+        p = self.p_value
+        return "easy" if p >= 0.7 else "medium" if p >= 0.4 else "hard"
+
+    @property
+    def logit_difficulty(self) -> float:
+        """Rasch-style difficulty on the same logit scale as student ability"""
+        return -_logit(self.p_value)
+
+    def to_state(self) -> Dict:
+        return {
+            "key": self.key,
+            "topic": self.topic,
+            "difficulty": self.difficulty,
+            "question": self.question.to_dict(),
+            "responses": self.responses,
+            "correct": self.correct,
+            "sum_total": self.sum_total,
+            "sum_total_sq": self.sum_total_sq,
+            "sum_total_correct": self.sum_total_correct,
+            "option_counts": self.option_counts,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "ItemStats":
+        item = cls(state["key"], state["topic"], state["difficulty"], MCQQuestion.from_dict(state["question"]))
+        item.responses = state["responses"]
+        item.correct = state["correct"]
+        item.sum_total = state["sum_total"]
+        item.sum_total_sq = state["sum_total_sq"]
+        item.sum_total_correct = state["sum_total_correct"]
+        item.option_counts.update(state["option_counts"])
+        return item
+
+    def summary(self) -> Dict:
+        discrimination = self.discrimination
+        return {
+            "item_key": self.key,
+            "topic": self.topic,
+            "difficulty": self.difficulty,
+            "question": self.question.question,
+            "responses": self.responses,
+            "calibrated": self.calibrated,
+            "p_value": round(self.p_value, 3),
+            "discrimination": round(discrimination, 3) if discrimination is not None else None,
+            "band": self.band,
+            "option_frequencies": {
+                k: round(c / self.responses, 3) if self.responses else 0.0
+                for k, c in self.option_counts.items()
+            },
+        }
+
+class ItemBank:
+    """In-memory bank of every MCQ question served, with per-item statistics and student ability estimates.
+
+    Snapshot records are keyed "<topic>/<item_key>", so a restore only indexes keys by topic; each item,
+    and the student tallies, are decoded on first use.
+    """
+
+    def __init__(self):
+        self.items: Dict[str, ItemStats] = {}
+        self.by_topic: Dict[str, List[str]] = {}
+        self._abilities: Optional[Dict[str, List[int]]] = {}  # student_id -> [correct, answered]; None = still in the snapshot
+        self._snapshot: Optional[Snapshot] = None
+        self._namespace = ""
+        self._lazy: Dict[str, str] = {}  # item_key -> snapshot key, not decoded yet
+
+    @property
+    def abilities(self) -> Dict[str, List[int]]:
+        if self._abilities is None:
+            try:
+                self._abilities = orjson.loads(self._snapshot.read(self._namespace, STUDENTS_RECORD))
+            except (SnapshotError, orjson.JSONDecodeError) as e:
+                print(f"⚠️  Skipping item bank record {STUDENTS_RECORD}: {e}")
+                self._abilities = {}
+        return self._abilities
+
+    def _item(self, key: str) -> Optional[ItemStats]:
+        item = self.items.get(key)
+        if item is None and key in self._lazy:
+            snapshot_key = self._lazy.pop(key)
+            try:
+                item = ItemStats.from_state(orjson.loads(self._snapshot.read(self._namespace, snapshot_key)))
+            except (SnapshotError, orjson.JSONDecodeError, KeyError) as e:
+                print(f"⚠️  Skipping item bank record {snapshot_key}: {e}")
+                return None
+            self.items[key] = item
+        return item
+
+    def dump_snapshot(self) -> Iterable[Tuple[str, Record]]:
+        for key, item in self.items.items():
+            yield f"{item.topic.lower()}/{key}", orjson.dumps(item.to_state())
+        for snapshot_key in self._lazy.values():
+            yield snapshot_key, self._snapshot.record(self._namespace, snapshot_key)
+        if self._abilities is None:
+            yield STUDENTS_RECORD, self._snapshot.record(self._namespace, STUDENTS_RECORD)
+        else:
+            yield STUDENTS_RECORD, orjson.dumps(self._abilities)
+
+    def load_snapshot(self, snapshot: Snapshot, namespace: str):
+        """Index the snapshot's items by topic without decoding them (also on re-attach after a save)"""
+        previous = self._lazy
+        self._snapshot = snapshot
+        self._namespace = namespace
+        self._lazy = {}
+        if not self._abilities and snapshot.record(namespace, STUDENTS_RECORD) is not None:
+            self._abilities = None
+        for snapshot_key in snapshot.keys(namespace):
+            if snapshot_key == STUDENTS_RECORD:
+                continue
+            topic, _, key = snapshot_key.rpartition("/")
+            if key in self.items:
+                continue
+            self._lazy[key] = snapshot_key
+            if not topic:
+                # Written before records carried their topic: decode once to index it
+                item = self._item(key)
+                if item:
+                    self.by_topic.setdefault(item.topic.lower(), []).append(key)
+            elif key not in previous:
+                self.by_topic.setdefault(topic, []).append(key)
+
+    def register_questions(self, topic: str, difficulty: str, questions: List[MCQQuestion]):
+        """Add questions to the bank and tag each with its item_key"""
+        for q in questions:
+            key = item_key(topic, q)
+            q.item_key = key
+            if key not in self.items and key not in self._lazy:
+                self.items[key] = ItemStats(key, topic, difficulty, q.copy(id=""))
+                self.by_topic.setdefault(topic.lower(), []).append(key)
+
+    def record_answer(self, key: Optional[str], selected: str, is_correct: bool, total_score: float):
+        item = self._item(key) if key else None
+        if item:
+            item.record(selected, is_correct, total_score)
+
+    def record_student(self, student_id: str, correct: int, answered: int):
+        tally = self.abilities.setdefault(student_id, [0, 0])
+        tally[0] += correct
+        tally[1] += answered
+
+    def ability(self, student_id: str) -> float:
+        """Smoothed logit of the student's running proportion correct (0.0 for unknown students)"""
+        correct, answered = self.abilities.get(student_id, (0, 0))
+        return _logit((correct + 1) / (answered + 2))
+
+    def topic_items(self, topic: str, difficulty: Optional[str] = None) -> List[ItemStats]:
+        items = [item for item in map(self._item, self.by_topic.get(topic.lower(), [])) if item is not None]
+        if difficulty:
+            items = [item for item in items if item.difficulty == difficulty]
+        return items
+
+    def assemble(self, topic: str, count: int, difficulty: Optional[str] = None,
+                 target_distribution: Optional[Dict[str, float]] = None,
+                 ability: Optional[float] = None) -> List[MCQQuestion]:
+        """Pick `count` bank questions, either matching a band distribution or targeting an ability level.
+
+        Raises ValueError when the bank cannot supply enough questions.
+        """
+        items = self.topic_items(topic, difficulty)
+        if len(items) < count:
+            raise ValueError(f"Item bank has {len(items)} {topic} questions, {count} requested")
+
+        if ability is not None:
+            # Most informative items sit closest to the student's ability; shuffle first so ties vary
+            random.shuffle(items)
+            items.sort(key=lambda item: abs(item.logit_difficulty - ability))
+            chosen = items[:count]
+        else:
+            chosen = self._sample_distribution(items, count, target_distribution)
+
+        return [item.question for item in chosen]
+
+    def _sample_distribution(self, items: List[ItemStats], count: int,
+                             target_distribution: Optional[Dict[str, float]]) -> List[ItemStats]:
+        if not target_distribution:
+            return random.sample(items, count)
+
+        by_band = {band: [] for band in DIFFICULTY_BANDS}
+        for item in items:
+            by_band[item.band].append(item)
+
+        weight_total = sum(max(0.0, target_distribution.get(band, 0.0)) for band in DIFFICULTY_BANDS) or 1.0
+        wanted = {band: int(round(count * max(0.0, target_distribution.get(band, 0.0)) / weight_total))
+                  for band in DIFFICULTY_BANDS}
+
+        chosen = []
+        for band in DIFFICULTY_BANDS:
+            pool = by_band[band]
+            take = min(wanted[band], len(pool), count - len(chosen))
+            picked = random.sample(pool, take)
+            chosen.extend(picked)
+            picked_keys = {item.key for item in picked}
+            by_band[band] = [item for item in pool if item.key not in picked_keys]
+
+        # Rounding or thin bands leave a shortfall: top up from whatever remains
+        if len(chosen) < count:
+            leftovers = [item for band in DIFFICULTY_BANDS for item in by_band[band]]
+            chosen.extend(random.sample(leftovers, count - len(chosen)))
+
+        random.shuffle(chosen)
+        return chosen
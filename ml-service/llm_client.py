@@ -0,0 +1,161 @@
+"""
+HashProof LLM Client
+Async DeepSeek client shared by the MCQ and code assessment services
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Union
+from config import DEEPSEEK_BASE_URL, MODEL, LLM_CALL_DEADLINE_SECONDS
+from metrics import METRICS
+from prompts import RenderedPrompt, cached_prompt_tokens
+from rate_limit import UPSTREAM_LIMITER, estimate_tokens, is_retryable, retry_after, backoff_delay
+from usage import USAGE
+
+WARMUP_TIMEOUT_SECONDS = 10.0
+QUOTA_BUSY = "AI Error: upstream quota busy"  # returned instead of queueing when wait_for_quota=False
+
+class DeepSeekClient:
+    """Built cheaply at import; the openai import and upstream connections are deferred to warm_up()"""
+
+    def __init__(self):
+        self.client = None
+        self._configured = False
+        self.warmup_seconds: Optional[float] = None
+        self.response_format_supported = True  # cleared the first time the provider rejects response_format
+
+    def _configure(self):
+        """Create the underlying AsyncOpenAI client on first use"""
+        if self._configured:
+            return
+        self._configured = True
+        api_key = os.getenv("DEEPSEEK_API_KEY")
+        if not api_key:
+            print("⚠️  Warning: DEEPSEEK_API_KEY environment variable not set!")
+            return
+        from openai import AsyncOpenAI  # deferred: importing openai dominates module import time
+        self.client = AsyncOpenAI(
+            base_url=DEEPSEEK_BASE_URL,
+            api_key=api_key,
+            timeout=120.0,
+            max_retries=0  # retries go through ask_ai, which knows the shared quota and the caller's deadline
+        )
+
+    async def warm_up(self):
+        """Import openai off the event loop and pre-open the upstream connection (DNS, TCP, TLS)"""
+        started = time.perf_counter()
+        await asyncio.to_thread(__import__, "openai")
+        self._configure()
+        if self.client:
+            try:
+                await asyncio.wait_for(self.client.models.list(), timeout=WARMUP_TIMEOUT_SECONDS)
+                print("🔥 Upstream connection warmed up")
+            except Exception as e:
+                # The pool may still hold a live connection; real calls retry on their own
+                print(f"⚠️  Upstream warm-up request failed: {e}")
+        self.warmup_seconds = time.perf_counter() - started
+
+    async def ask_ai(self, prompt: Union[str, RenderedPrompt], max_tokens: int = 1000, temperature: float = 0.3,
+                     kind: str = "other", topic: Optional[str] = None, difficulty: Optional[str] = None,
+                     question_count: int = 1, response_format: Optional[Dict] = None,
+                     deadline: float = LLM_CALL_DEADLINE_SECONDS, wait_for_quota: bool = True) -> str:
+        """Ask DeepSeek AI via HuggingFace with the official openai library; failures return "AI Error: ..." """
+        template = None
+        if isinstance(prompt, RenderedPrompt):
+            template, prompt = prompt.template, prompt.text
+
+        self._configure()
+        if not self.client:
+            return "AI Error: DEEPSEEK_API_KEY not set."
+
+        reserved = estimate_tokens(prompt, max_tokens)
+        if not wait_for_quota and not UPSTREAM_LIMITER.try_acquire(reserved):
+            METRICS.incr("llm_calls_quota_busy")
+            return QUOTA_BUSY
+
+        print(f"🔍 Making API request to: {DEEPSEEK_BASE_URL} with model {MODEL}")
+        METRICS.incr("llm_calls_started")
+
+        started = time.monotonic()
+        try:
+            attempt = 0
+            while True:
+                if wait_for_quota:
+                    await UPSTREAM_LIMITER.acquire(reserved, deadline - (time.monotonic() - started))
+                try:
+                    completion = await self._create(prompt, max_tokens, temperature, response_format,
+                                                    timeout=max(1.0, deadline - (time.monotonic() - started)))
+                    break
+                except Exception as e:
+                    UPSTREAM_LIMITER.settle(reserved, 0)
+                    if not is_retryable(e) or not wait_for_quota:
+                        raise
+                    delay = backoff_delay(attempt, e)
+                    if getattr(e, "status_code", None) == 429:
+                        METRICS.incr("llm_rate_limited")
+                        UPSTREAM_LIMITER.pause(retry_after(e) or delay)
+                    if time.monotonic() - started + delay >= deadline:
+                        raise
+                    attempt += 1
+                    METRICS.incr("llm_retries")
+                    print(f"🔁 Upstream error ({e}), retry {attempt} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+            UPSTREAM_LIMITER.settle(reserved, getattr(completion.usage, "total_tokens", None))
+            choice = completion.choices[0]
+            response_text = choice.message.content
+            METRICS.incr("llm_calls_completed")
+            if template is not None and completion.usage is not None:
+                template.record_usage(completion.usage.prompt_tokens or 0, cached_prompt_tokens(completion.usage))
+            USAGE.record(kind, completion.usage, choice.finish_reason, max_tokens,
+                         topic=topic, difficulty=difficulty, question_count=question_count)
+            return response_text
+
+        except asyncio.CancelledError:
+            METRICS.incr("llm_calls_cancelled")
+            METRICS.incr("llm_max_tokens_cancelled", max_tokens)
+            raise
+
+        except Exception as e:
+            error_msg = f"Request failed: {str(e)}"
+            print(f"❌ {error_msg}")
+            METRICS.incr("llm_calls_failed")
+            return f"AI Error: {error_msg}"
+
+    async def _create(self, prompt: str, max_tokens: int, temperature: float, response_format: Optional[Dict],
+                      timeout: float):
+        extra = {}
+        if response_format and self.response_format_supported:
+            extra["response_format"] = response_format
+        try:
+            return await self.client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                **extra
+            )
+        except Exception as e:
+            if not extra or getattr(e, "status_code", None) not in (400, 422):
+                raise
+            # Only an error that names the parameter turns it off for good; any other 400 (an oversized
+            # prompt, a bad value) may have nothing to do with it, so just this call is repeated without
+            if _names_response_format(e):
+                self.response_format_supported = False
+                METRICS.incr("structured_output_unsupported")
+                print(f"⚠️  Provider rejected response_format ({e}); continuing with prompt-only JSON")
+            else:
+                METRICS.incr("structured_output_retried_without")
+                print(f"⚠️  Request with response_format failed ({e}); retrying this call without it")
+            return await self._create(prompt, max_tokens, temperature, None, timeout)
+
+def _names_response_format(error: Exception) -> bool:
+    text = f"{error} {getattr(error, 'body', '')}".lower()
+    return "response_format" in text or "json_schema" in text
+
+# One client (and connection pool) per process, shared by every router mounted in it
+ai_client = DeepSeekClient()
@@ -0,0 +1,102 @@
+"""
+HashProof Event Loop Monitor
+Measures event-loop lag continuously and logs the stack of any callback that blocks the loop too long
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, Optional
+from metrics import METRICS
+
+# CONFIGURATION
+LOOP_MONITOR_INTERVAL_SECONDS = float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", "0.1"))
+LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250")) / 1000
+LAG_WINDOW = 600  # recent lag samples kept for percentiles (one minute at the default interval)
+
+class LoopMonitor:
+    """A ticker task on the loop plus a watchdog thread.
+
+    The ticker sleeps `interval` and records how late it woke up (the loop's scheduling lag). The
+    watchdog notices when the ticker has not run for longer than `threshold` and, while the loop is
+    still stuck, captures the loop thread's current stack, i.e. the code that is blocking it.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL_SECONDS, threshold: float = LOOP_LAG_THRESHOLD_SECONDS):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self.max_lag = 0.0
+        self.blocked_events = 0
+        self.last_blocking_stack: Optional[str] = None
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                METRICS.incr("loop_lag_over_threshold")
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported_heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported_heartbeat = heartbeat  # one report per blocking episode
+            self.blocked_events += 1
+            self.last_blocking_stack = "".join(traceback.format_stack(frame))
+            METRICS.incr("loop_blocked_events")
+            print(f"🐢 Event loop blocked for {stalled * 1000:.0f}ms+, blocking stack:\n{self.last_blocking_stack}")
+
+    def status(self) -> Dict:
+        ordered = sorted(self.lags)
+
+        def pick(q: float) -> Optional[float]:
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1) if ordered else None
+
+        return {
+            "lag_p50_ms": pick(0.5),
+            "lag_p99_ms": pick(0.99),
+            "lag_max_ms": round(self.max_lag * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000),
+            "blocked_events": self.blocked_events,
+        }
@@ -3,29 +3,41 @@ HashProof MCQ Assessment System
 Handles Multiple Choice Questions generation and grading
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import uvicorn
-from openai import OpenAI
-import json
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Tuple
 import uuid
 import asyncio
 import os
-from dotenv import load_dotenv
-
-load_dotenv() 
+import random
+from item_stats import ItemBank
+from llm_client import ai_client
+from usage import USAGE
+from disconnect import cancel_on_disconnect
+from bulk import MAX_COHORT_SIZE, pool_target, generation_batches, dedupe, compose_cohort, stream_tests
+from service_app import build_app
+from storage import TEST_STORAGE
+from variants import VARIANTS, Variant
+from question_bank import QUESTION_BANK
+from prompts import MCQ_GENERATION
+from structured_output import MCQ_RESPONSE_FORMAT, generate_validated
+from idempotency import GRADINGS, request_fingerprint
+from webhooks import WEBHOOKS, accept_for_webhook
+from analytics import RESULTS, PASS_THRESHOLD, letter_grade
+from question_models import MCQQuestion, StoredTest
 
 # CONFIGURATION
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-DEEPSEEK_BASE_URL = "https://router.huggingface.co/v1"
-MODEL = "deepseek-ai/DeepSeek-R1:novita"
+# Let generations finish after the client leaves: their questions still refill the item bank
+DETACH_GENERATION_ON_DISCONNECT = os.getenv("DETACH_GENERATION_ON_DISCONNECT", "true").lower() == "true"
+MAX_QUESTIONS_PER_GENERATION = 20
 
 # DATA MODELS
 class TestRequest(BaseModel):
     difficulty: str = "beginner"  # beginner, intermediate, advanced
     question_count: int = 5
     topic: str = "JavaScript"
+    student_id: Optional[str] = None  # respond with this student's variant of the generated test
 
 class MCQAnswer(BaseModel):
     question_id: str
@@ -35,152 +47,55 @@ class GradeRequest(BaseModel):
     student_id: str
     test_id: str
     mcq_answers: List[MCQAnswer]
+    idempotency_key: Optional[str] = None  # defaults to a hash of student_id, test_id and answers
+    deliver_by_webhook: bool = False  # answer 202 at once; the result is only delivered to RESULT_WEBHOOK_URL
 
-class DeepSeekClient:
-    def __init__(self):
-        if not DEEPSEEK_API_KEY:
-            print("⚠️  Warning: DEEPSEEK_API_KEY environment variable not set!")
-            self.client = None
-        else:
-            self.client = OpenAI(
-                base_url=DEEPSEEK_BASE_URL,
-                api_key=DEEPSEEK_API_KEY,
-                timeout=120.0
-            )
-
-    async def ask_ai(self, prompt: str, max_tokens: int = 1000, temperature: float = 0.3) -> str:
-        """Ask DeepSeek AI via HuggingFace with the official openai library"""
-        if not self.client:
-            return "AI Error: DEEPSEEK_API_KEY not set."
-
-        print(f"🔍 Making API request to: {DEEPSEEK_BASE_URL} with model {MODEL}")
-
-        try:
-            completion = self.client.chat.completions.create(
-                model=MODEL,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-            response_text = completion.choices[0].message.content
-            return response_text
+class VariantRequest(BaseModel):
+    test_id: str
+    student_id: str
 
-        except Exception as e:
-            error_msg = f"Request failed: {str(e)}"
-            print(f"❌ {error_msg}")
-            return f"AI Error: {error_msg}"
+class BulkTestRequest(BaseModel):
+    cohort_size: int = 30
+    difficulty: str = "beginner"
+    question_count: int = 5
+    topic: str = "JavaScript"
 
-ai_client = DeepSeekClient()
+class AssembleRequest(BaseModel):
+    topic: str = "JavaScript"
+    question_count: int = 5
+    difficulty: Optional[str] = None  # restrict to one nominal difficulty, or mix all
+    target_distribution: Optional[Dict[str, float]] = None  # e.g. {"easy": 0.3, "medium": 0.5, "hard": 0.2}
+    student_id: Optional[str] = None  # adapt to this student's running ability estimate
+    ability: Optional[float] = None  # explicit ability on the logit scale, overrides student_id
 
-def safe_json_parse(response: str, topic: str, difficulty: str, count: int) -> List[Dict]:
-    """Safely parse JSON with comprehensive error handling"""
-    
-    print(f"🔍 Raw AI Response: {response[:300]}...")
-    
-    # Check if response contains an error
-    if "AI Error:" in response:
-        print(f"❌ AI Error detected, using fallback questions")
-        return _create_fallback_mcq(topic, difficulty, count)
-    
-    response = response.strip()
-    
-    if response.startswith('```json'):
-        response = response[7:]
-    if response.startswith('```'):
-        response = response[3:]
-    if response.endswith('```'):
-        response = response[:-3]
-    response = response.strip()
-    
-    json_start = response.find('[')
-    json_end = response.rfind(']') + 1
-    
-    if json_start != -1 and json_end > json_start:
-        json_str = response[json_start:json_end]
-        print(f"🔍 Extracted JSON: {json_str[:200]}...")
-        
-        try:
-            parsed = json.loads(json_str)
-            if isinstance(parsed, list) and len(parsed) > 0:
-                print(f"✅ Successfully parsed {len(parsed)} questions")
-                return parsed
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parsing failed: {e}")
-    
-    try:
-        parsed = json.loads(response)
-        if isinstance(parsed, list) and len(parsed) > 0:
-            print(f"✅ Successfully parsed entire response: {len(parsed)} questions")
-            return parsed
-    except json.JSONDecodeError as e:
-        print(f"❌ Full response JSON parsing failed: {e}")
-    
-    print(f"⚠️  Falling back to hardcoded questions")
-    return _create_fallback_mcq(topic, difficulty, count)
+# Every MCQ question served lands here so graded answers can calibrate it
+ITEM_BANK = ItemBank()
 
 # MCQ QUESTION GENERATION
-async def generate_mcq_questions(topic: str, difficulty: str, count: int) -> List[Dict]:
-    """Generate MCQ questions with improved prompts"""
+async def generate_mcq_questions(topic: str, difficulty: str, count: int) -> List[MCQQuestion]:
+    """Generate MCQ questions, salvaging partial responses and asking again only for what is missing"""
     
     try:
-        prompt = f"""Generate {count} multiple choice questions about {topic} programming.
-
-Return ONLY a JSON array with this exact format:
-
-[{{"id": "q1", "question": "What is a variable in {topic}?", "options": {{"A": "Stores data", "B": "Wrong answer", "C": "Also wrong", "D": "Wrong too"}}, "correct": "A", "points": 2, "explanation": "Variables store data values"}}]
-
-Requirements:
-- Questions about {topic} programming
-- Difficulty: {difficulty} level
-- Each question worth 2-4 points based on difficulty
-- Options must use A, B, C, D format
-- Include brief explanations
-
-JSON array only, no other text:"""
-
-        print(f"🚀 Generating {count} MCQ questions for {topic} ({difficulty})")
-        response = await ai_client.ask_ai(prompt, max_tokens=2000, temperature=0.3)
+        points = 2 if difficulty == "beginner" else 3 if difficulty == "intermediate" else 4
         
-        questions = safe_json_parse(response, topic, difficulty, count)
+        async def request(n: int, existing: List[str]) -> str:
+            print(f"🚀 Generating {n} MCQ questions for {topic} ({difficulty})")
+            return await ai_client.ask_ai(
+                MCQ_GENERATION.render(topic=topic, difficulty=difficulty, count=n,
+                                      existing="; ".join(existing) or "none"),
+                max_tokens=USAGE.max_tokens_for("mcq_generation", n),
+                temperature=0.3,
+                kind="mcq_generation",
+                topic=topic,
+                difficulty=difficulty,
+                question_count=n,
+                response_format=MCQ_RESPONSE_FORMAT
+            )
         
-        # Validate and fix each question
-        valid_questions = []
-        for i, q in enumerate(questions[:count]):
-            try:
-                question_id = f"{topic.lower()}_mcq_{i+1}"
-                points = q.get("points", 2 if difficulty == "beginner" else 3 if difficulty == "intermediate" else 4)
-                
-                options = q.get("options", {})
-                if isinstance(options, list):
-                    # Convert list to dict
-                    option_dict = {}
-                    letters = ["A", "B", "C", "D"]
-                    for idx, opt in enumerate(options[:4]):
-                        clean_opt = opt.split(") ", 1)[-1] if ") " in opt else opt
-                        option_dict[letters[idx]] = clean_opt
-                    options = option_dict
-                
-                required_keys = ["A", "B", "C", "D"]
-                if not all(key in options for key in required_keys):
-                    print(f"⚠️  Question {i+1} missing required options, skipping")
-                    continue
-                    
-                valid_q = {
-                    "id": question_id,
-                    "question": q.get("question", f"What is an important concept in {topic}?"),
-                    "options": options,
-                    "correct": q.get("correct", "A") if q.get("correct") in required_keys else "A",
-                    "points": points,
-                    "explanation": q.get("explanation", "Check the documentation for details")
-                }
-                valid_questions.append(valid_q)
-                print(f"✅ Created valid MCQ question: {question_id}")
-                
-            except Exception as e:
-                print(f"❌ Error processing MCQ question {i+1}: {e}")
-                continue
+        def build(raw: Dict, index: int) -> MCQQuestion:
+            return MCQQuestion.from_llm(raw, f"{topic.lower()}_mcq_{index+1}", topic, points)
+        
+        valid_questions = await generate_validated(request, build, count, key=lambda q: q.question, label="MCQ")
                 
         if not valid_questions:
             print("⚠️  No valid questions generated, using fallbacks")
@@ -193,153 +108,68 @@ JSON array only, no other text:"""
         print(f"❌ MCQ generation failed: {e}")
         return _create_fallback_mcq(topic, difficulty, count)
 
-def _create_fallback_mcq(topic: str, difficulty: str, count: int) -> List[Dict]:
-    """Create reliable fallback MCQ questions"""
-    fallback_questions = {
-        "Python": [
-            {
-                "question": "Which of the following is the correct way to create a list in Python?",
-                "options": {
-                    "A": "my_list = []",
-                    "B": "my_list = {}",
-                    "C": "my_list = ()",
-                    "D": "my_list = <>"
-                },
-                "correct": "A",
-                "explanation": "Square brackets [] are used to create lists in Python"
-            },
-            {
-                "question": "What is the output of print(type(5.0)) in Python?",
-                "options": {
-                    "A": "<class 'int'>",
-                    "B": "<class 'float'>", 
-                    "C": "<class 'number'>",
-                    "D": "<class 'double'>"
-                },
-                "correct": "B", 
-                "explanation": "5.0 is a floating-point number, so type() returns <class 'float'>"
-            },
-            {
-                "question": "How do you create a comment in Python?",
-                "options": {
-                    "A": "// This is a comment",
-                    "B": "/* This is a comment */",
-                    "C": "# This is a comment", 
-                    "D": "<!-- This is a comment -->"
-                },
-                "correct": "C",
-                "explanation": "Python uses # for single-line comments"
-            },
-            {
-                "question": "What is the correct way to define a function in Python?",
-                "options": {
-                    "A": "def function_name():",
-                    "B": "function function_name():",
-                    "C": "define function_name():",
-                    "D": "func function_name():"
-                },
-                "correct": "A",
-                "explanation": "Python uses 'def' keyword to define functions"
-            }
-        ],
-        "JavaScript": [
-            {
-                "question": "How do you declare a variable in JavaScript?",
-                "options": {
-                    "A": "var x = 5",
-                    "B": "variable x = 5",
-                    "C": "v x = 5",
-                    "D": "declare x = 5"
-                },
-                "correct": "A",
-                "explanation": "The 'var' keyword is used to declare variables in JavaScript"
-            },
-            {
-                "question": "What does the === operator do in JavaScript?",
-                "options": {
-                    "A": "Assigns a value",
-                    "B": "Compares value only",
-                    "C": "Compares value and type",
-                    "D": "Creates a variable"
-                },
-                "correct": "C",
-                "explanation": "The === operator performs strict equality comparison, checking both value and type"
-            },
-            {
-                "question": "Which method adds an element to the end of an array?",
-                "options": {
-                    "A": "push()",
-                    "B": "add()",
-                    "C": "append()",
-                    "D": "insert()"
-                },
-                "correct": "A",
-                "explanation": "The push() method adds elements to the end of an array"
-            },
-            {
-                "question": "How do you create a function in JavaScript?",
-                "options": {
-                    "A": "function myFunction() {}",
-                    "B": "def myFunction() {}",
-                    "C": "create myFunction() {}",
-                    "D": "func myFunction() {}"
-                },
-                "correct": "A",
-                "explanation": "JavaScript uses 'function' keyword to create functions"
-            }
-        ]
-    }
-    
-    questions = fallback_questions.get(topic, fallback_questions["JavaScript"])
+def _create_fallback_mcq(topic: str, difficulty: str, count: int) -> List[MCQQuestion]:
+    """Create reliable fallback MCQ questions from the built-in question bank"""
     points = 2 if difficulty == "beginner" else 3 if difficulty == "intermediate" else 4
     
-    result = []
-    for i in range(count):
-        q = questions[i % len(questions)] 
-        result.append({
-            "id": f"{topic.lower()}_mcq_{i+1}",
-            "question": q["question"],
-            "options": q["options"],
-            "correct": q["correct"],
-            "points": points,
-            "explanation": q["explanation"]
-        })
-    
-    return result
+    return [
+        MCQQuestion(
+            id=f"{topic.lower()}_mcq_{i+1}",
+            question=q["question"],
+            options=q["options"],
+            correct=q["correct"],
+            points=points,
+            explanation=q.get("explanation")
+        )
+        for i, q in enumerate(QUESTION_BANK.sample("mcq", topic, difficulty, count))
+    ]
 
 # MCQ GRADING
-async def grade_mcq(answers: List[MCQAnswer], test_questions: List[Dict]) -> Dict:
-    """Grade multiple choice questions"""
+async def grade_mcq(answers: List[MCQAnswer], test_data: StoredTest, variant: Optional[Variant] = None) -> Dict:
+    """Grade multiple choice questions; with a `variant`, answers are in that student's option lettering"""
     if not answers:
         return {"score": 0, "points": 0, "total": 0, "feedback": []}
     
     correct = 0
     total_points = 0
     feedback = []
+    responses = []
     
-    question_lookup = {q["id"]: q for q in test_questions}
+    question_lookup = test_data.lookup
+    positions = {q.id: i for i, q in enumerate(test_data.questions)} if variant else None
     
     for answer in answers:
         question = question_lookup.get(answer.question_id)
         
         if question:
-            if answer.selected_answer == question["correct"]:
+            selected = answer.selected_answer
+            correct_shown = question.correct
+            if variant:
+                selected = variant.original_letter(positions[answer.question_id], selected)
+                correct_shown = variant.shown_letter(positions[answer.question_id], question.correct)
+            is_correct = selected == question.correct
+            responses.append((question.item_key, selected, is_correct))
+            if is_correct:
                 correct += 1
-                total_points += question["points"]
+                total_points += question.points
                 feedback.append({
                     "question_id": answer.question_id,
                     "correct": True,
-                    "explanation": question.get("explanation", "Correct!")
+                    "explanation": question.explanation or "Correct!"
                 })
             else:
                 feedback.append({
                     "question_id": answer.question_id,
                     "correct": False,
-                    "explanation": question.get("explanation", f"Correct answer was {question['correct']}")
+                    "explanation": question.explanation or f"Correct answer was {correct_shown}"
                 })
     
+    score = correct / len(answers) if answers else 0
+    for key, selected, is_correct in responses:
+        ITEM_BANK.record_answer(key, selected, is_correct, score)
+    
     return {
-        "score": correct / len(answers) if answers else 0,
+        "score": score,
         "points": total_points,
         "total": len(answers),
         "correct": correct,
@@ -347,7 +177,7 @@ async def grade_mcq(answers: List[MCQAnswer], test_questions: List[Dict]) -> Dic
     }
 
 # TEST GENERATION AND GRADING
-async def generate_mcq_test(topic: str, difficulty: str, count: int) -> Dict:
+async def generate_mcq_test(topic: str, difficulty: str, count: int) -> StoredTest:
     """Generate an MCQ test"""
     test_id = str(uuid.uuid4())
     
@@ -358,91 +188,98 @@ async def generate_mcq_test(topic: str, difficulty: str, count: int) -> Dict:
             generate_mcq_questions(topic, difficulty, count), 
             timeout=60.0
         )
+        ITEM_BANK.register_questions(topic, difficulty, mcq_questions)
         
-        total_points = sum(q["points"] for q in mcq_questions)
-        
-        result = {
-            "test_id": test_id,
-            "type": "mcq",
-            "topic": topic,
-            "difficulty": difficulty,
-            "questions": mcq_questions,
-            "total_points": total_points,
-            "question_count": len(mcq_questions)
-        }
+        result = StoredTest(test_id, "mcq", topic, difficulty, mcq_questions)
         
-        print(f"✅ MCQ test generated: {len(mcq_questions)} questions, {total_points} points")
+        print(f"✅ MCQ test generated: {len(mcq_questions)} questions, {result.total_points} points")
         return result
         
     except asyncio.TimeoutError:
         print("⏰ MCQ generation timed out, using fallbacks")
         mcq_questions = _create_fallback_mcq(topic, difficulty, count)
-        total_points = sum(q["points"] for q in mcq_questions)
+        ITEM_BANK.register_questions(topic, difficulty, mcq_questions)
         
-        return {
-            "test_id": test_id,
-            "type": "mcq",
-            "topic": topic,
-            "difficulty": difficulty,
-            "questions": mcq_questions,
-            "total_points": total_points,
-            "question_count": len(mcq_questions),
-            "fallback_used": True
-        }
+        return StoredTest(test_id, "mcq", topic, difficulty, mcq_questions, extra={"fallback_used": True})
     except Exception as e:
         print(f"❌ MCQ test generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate MCQ test: {str(e)}")
 
-async def grade_mcq_test(request: GradeRequest, test_data: Dict) -> Dict:
-    """Grade an MCQ test"""
+async def _generate_pool_batch(topic: str, difficulty: str, count: int) -> List[MCQQuestion]:
     try:
-        mcq_result = await grade_mcq(request.mcq_answers, test_data["questions"])
+        questions = await asyncio.wait_for(generate_mcq_questions(topic, difficulty, count), timeout=60.0)
+    except asyncio.TimeoutError:
+        print("⏰ MCQ pool generation timed out, using fallbacks")
+        questions = _create_fallback_mcq(topic, difficulty, count)
+    ITEM_BANK.register_questions(topic, difficulty, questions)
+    return questions
+
+async def build_mcq_pool(topic: str, difficulty: str, question_count: int) -> Tuple[List[MCQQuestion], int, int]:
+    """Question pool for a cohort: bank questions first, then the fewest upstream generations for the rest.
+
+    Returns (pool, bank_questions_used, upstream_generations).
+    """
+    target = pool_target(question_count)
+    banked = [item.question for item in ITEM_BANK.topic_items(topic, difficulty)]
+    pool = random.sample(banked, min(target, len(banked)))
+    bank_used = len(pool)
+    
+    batches = generation_batches(target - len(pool), MAX_QUESTIONS_PER_GENERATION)
+    if batches:
+        print(f"🚀 Filling MCQ cohort pool: {bank_used} from bank, {len(batches)} generation(s)")
+        generated = await asyncio.gather(*(_generate_pool_batch(topic, difficulty, n) for n in batches))
+        pool.extend(q for batch in generated for q in batch)
+    
+    return dedupe(pool, lambda q: q.item_key), bank_used, len(batches)
+
+async def grade_mcq_test(request: GradeRequest, test_data: StoredTest, variant: Optional[Variant] = None) -> Dict:
+    """Grade an MCQ test; `test_data` is the base test when grading a variant"""
+    try:
+        mcq_result = await grade_mcq(request.mcq_answers, test_data, variant)
+        ITEM_BANK.record_student(request.student_id, mcq_result["correct"], mcq_result["total"])
         
         overall_score = mcq_result["score"]
-        passed = overall_score >= 0.7
+        passed = overall_score >= PASS_THRESHOLD
         
-        return {
+        result = {
             "student_id": request.student_id,
             "test_id": request.test_id,
             "test_type": "mcq",
             "overall_score": round(overall_score, 2),
             "total_points": mcq_result["points"],
-            "max_possible_points": test_data["total_points"],
+            "max_possible_points": test_data.total_points,
             "passed": passed,
             "certificate_eligible": passed,
-            "grade": "A" if overall_score >= 0.9 else "B" if overall_score >= 0.8 else "C" if overall_score >= 0.7 else "D" if overall_score >= 0.6 else "F",
+            "grade": letter_grade(overall_score),
             "correct_answers": mcq_result["correct"],
             "total_questions": mcq_result["total"],
             "feedback": mcq_result["feedback"],
             "message": "Excellent work!" if overall_score >= 0.9 else "Good job!" if passed else "Keep practicing and try again!"
         }
+        if variant:
+            result["base_test_id"] = variant.base_test_id
+        return result
         
     except Exception as e:
         print(f"❌ MCQ grading failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to grade MCQ test: {str(e)}")
 
-# STORAGE
-TEST_STORAGE = {}
+async def grade_and_record(request: GradeRequest, test_data: StoredTest, idempotency_key: str,
+                           variant: Optional[Variant] = None) -> Dict:
+    """Grade once and log the result; run through GRADINGS so retries of the same request share it"""
+    result = await grade_mcq_test(request, test_data, variant)
+    result["idempotency_key"] = idempotency_key
+    RESULTS.record(test_data, result)
+    await WEBHOOKS.enqueue(test_data, result)
+    return result
 
-# FASTAPI APP
-app = FastAPI(
-    title="HashProof MCQ Assessment System", 
-    description="AI-powered MCQ assessment system using DeepSeek",
-    version="1.0.0"
-)
+# ROUTES
+router = APIRouter()
 
-@app.get("/")
-async def root():
-    return {
-        "message": "HashProof MCQ Assessment System is running!", 
-        "status": "healthy",
-        "ai_model": MODEL,
-        "type": "MCQ Assessment",
-        "features": ["AI-generated MCQ questions", "Intelligent MCQ grading", "Multiple topics and difficulties"]
-    }
+FEATURES = ["AI-generated MCQ questions", "Intelligent MCQ grading", "Multiple topics and difficulties"]
 
-@app.post("/generate_mcq_test")
-async def create_mcq_test(request: TestRequest):
+@router.post("/generate_mcq_test")
+async def create_mcq_test(request: TestRequest, http_request: Request):
     """Generate an MCQ test"""
     try:
         if request.question_count < 1 or request.question_count > 20:
@@ -451,74 +288,183 @@ async def create_mcq_test(request: TestRequest):
         if request.difficulty not in ["beginner", "intermediate", "advanced"]:
             raise HTTPException(status_code=400, detail="Difficulty must be beginner, intermediate, or advanced")
         
-        result = await generate_mcq_test(request.topic, request.difficulty, request.question_count)
-        TEST_STORAGE[result["test_id"]] = result
-        return result
+        result = await cancel_on_disconnect(
+            http_request,
+            generate_mcq_test(request.topic, request.difficulty, request.question_count),
+            detach=DETACH_GENERATION_ON_DISCONNECT
+        )
+        TEST_STORAGE[result.test_id] = result
+        if request.student_id:
+            result = VARIANTS.issue(result, request.student_id).render(result)
+        return Response(content=result.payload, media_type="application/json")
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate MCQ test: {str(e)}")
 
-@app.post("/grade_mcq_test")
+@router.post("/mcq_test_variant")
+async def create_mcq_test_variant(request: VariantRequest):
+    """This student's variant of a stored MCQ test: questions and options reordered, no AI call"""
+    base = TEST_STORAGE.get(request.test_id)
+    if not base:
+        raise HTTPException(status_code=404, detail="Test not found. Please generate a test first.")
+    if base.type != "mcq":
+        raise HTTPException(status_code=400, detail=f"Test {request.test_id} is not an MCQ test")
+    try:
+        variant = VARIANTS.issue(base, request.student_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=variant.render(base).payload, media_type="application/json")
+
+@router.post("/generate_mcq_test/bulk")
+async def create_mcq_test_bulk(request: BulkTestRequest, http_request: Request):
+    """Generate one distinct MCQ test per student from a shared question pool, streamed back as NDJSON"""
+    if request.cohort_size < 1 or request.cohort_size > MAX_COHORT_SIZE:
+        raise HTTPException(status_code=400, detail=f"Cohort size must be between 1 and {MAX_COHORT_SIZE}")
+    
+    if request.question_count < 1 or request.question_count > 20:
+        raise HTTPException(status_code=400, detail="Question count must be between 1 and 20")
+    
+    if request.difficulty not in ["beginner", "intermediate", "advanced"]:
+        raise HTTPException(status_code=400, detail="Difficulty must be beginner, intermediate, or advanced")
+    
+    pool, bank_used, generations = await cancel_on_disconnect(
+        http_request,
+        build_mcq_pool(request.topic, request.difficulty, request.question_count),
+        detach=DETACH_GENERATION_ON_DISCONNECT
+    )
+    
+    cohort_id = str(uuid.uuid4())
+    topic_key = request.topic.lower()
+    
+    def build(questions: List[MCQQuestion]) -> StoredTest:
+        return StoredTest(
+            str(uuid.uuid4()), "mcq", request.topic, request.difficulty,
+            [q.copy(id=f"{topic_key}_mcq_{i+1}") for i, q in enumerate(questions)],
+            extra={"cohort_id": cohort_id}
+        )
+    
+    tests = compose_cohort(pool, request.question_count, request.cohort_size, build)
+    TEST_STORAGE.put_many(tests)
+    print(f"✅ MCQ cohort {cohort_id}: {len(tests)} tests from a pool of {len(pool)} questions")
+    
+    return StreamingResponse(
+        stream_tests(tests),
+        media_type="application/x-ndjson",
+        headers={
+            "X-Cohort-Id": cohort_id,
+            "X-Pool-Size": str(len(pool)),
+            "X-Bank-Questions": str(bank_used),
+            "X-Upstream-Generations": str(generations)
+        }
+    )
+
+def prepare_grading(request: GradeRequest) -> Tuple[str, Callable[[], Awaitable[Dict]]]:
+    """Validate a grade request; returns its idempotency key and the grading to run"""
+    variant = VARIANTS.get(request.test_id)
+    if variant and variant.student_id != request.student_id:
+        raise HTTPException(status_code=400, detail=f"Test {request.test_id} was issued to a different student")
+    test_data = TEST_STORAGE.get(variant.base_test_id if variant else request.test_id)
+    if not test_data:
+        raise HTTPException(status_code=404, detail="Test not found. Please generate a test first.")
+    
+    if test_data.type != "mcq":
+        raise HTTPException(status_code=400, detail=f"Test {request.test_id} is not an MCQ test")
+    
+    if not request.mcq_answers:
+        raise HTTPException(status_code=400, detail="No MCQ answers provided")
+        
+    fingerprint = request_fingerprint("mcq", request.student_id, request.test_id,
+                                      [a.dict() for a in request.mcq_answers])
+    key = request.idempotency_key or fingerprint
+    return key, lambda: GRADINGS.run(f"mcq:{key}", fingerprint, lambda: grade_and_record(request, test_data, key, variant))
+
+WEBHOOKS.resume_with("mcq", lambda payload: prepare_grading(GradeRequest(**payload))[1])
+
+@router.post("/grade_mcq_test")
 async def grade_mcq_assessment(request: GradeRequest):
     """Grade an MCQ test"""
     try:
-        test_data = TEST_STORAGE.get(request.test_id)
-        if not test_data:
-            raise HTTPException(status_code=404, detail="Test not found. Please generate a test first.")
-        
-        if not request.mcq_answers:
-            raise HTTPException(status_code=400, detail="No MCQ answers provided")
-            
-        result = await grade_mcq_test(request, test_data)
-        return result
+        key, grading = prepare_grading(request)
+        if request.deliver_by_webhook:
+            return await accept_for_webhook("mcq", request, key, grading)
+        result = await grading()
+        return ORJSONResponse(result)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to grade MCQ test: {str(e)}")
 
-@app.get("/sample_mcq_test")
+@router.get("/sample_mcq_test")
 async def get_sample_mcq():
     """Get a sample MCQ test"""
     try:
         sample_request = TestRequest(difficulty="beginner", question_count=5, topic="JavaScript")
         result = await generate_mcq_test(sample_request.topic, sample_request.difficulty, sample_request.question_count)
-        TEST_STORAGE[result["test_id"]] = result
-        return result
+        TEST_STORAGE[result.test_id] = result
+        return Response(content=result.payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate sample MCQ test: {str(e)}")
 
-@app.get("/test/{test_id}")
-async def get_test(test_id: str):
-    """Retrieve a test by ID"""
-    test_data = TEST_STORAGE.get(test_id)
-    if not test_data:
-        raise HTTPException(status_code=404, detail="Test not found")
-    return test_data
-
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
+@router.post("/assemble_mcq_test")
+async def assemble_mcq_test(request: AssembleRequest):
+    """Assemble an MCQ test from the calibrated item bank without calling the AI"""
+    if request.question_count < 1 or request.question_count > 20:
+        raise HTTPException(status_code=400, detail="Question count must be between 1 and 20")
+    
+    if request.difficulty is not None and request.difficulty not in ["beginner", "intermediate", "advanced"]:
+        raise HTTPException(status_code=400, detail="Difficulty must be beginner, intermediate, or advanced")
+    
+    ability = request.ability
+    if ability is None and request.student_id:
+        ability = ITEM_BANK.ability(request.student_id)
+    
     try:
-        test_response = await ai_client.ask_ai("Say 'OK' if you can respond", max_tokens=10)
-        ai_healthy = "OK" in test_response or "ok" in test_response.lower()
-        
-        return {
-            "status": "healthy" if ai_healthy else "degraded",
-            "ai_connection": "connected" if ai_healthy else "issues",
-            "model": MODEL,
-            "tests_in_memory": len(TEST_STORAGE),
-            "type": "MCQ Assessment System"
-        }
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "error": str(e),
-            "ai_connection": "failed"
+        picked = ITEM_BANK.assemble(
+            request.topic,
+            request.question_count,
+            difficulty=request.difficulty,
+            target_distribution=request.target_distribution,
+            ability=ability
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    questions = [q.copy(id=f"{request.topic.lower()}_mcq_{i+1}") for i, q in enumerate(picked)]
+    result = StoredTest(
+        str(uuid.uuid4()), "mcq", request.topic, request.difficulty or "mixed", questions,
+        extra={
+            "assembled": True,
+            "ability_estimate": round(ability, 3) if ability is not None else None
         }
+    )
+    TEST_STORAGE[result.test_id] = result
+    return Response(content=result.payload, media_type="application/json")
+
+@router.get("/item_stats")
+async def get_item_stats(topic: str, difficulty: Optional[str] = None):
+    """Per-question statistics for every bank item of a topic"""
+    items = ITEM_BANK.topic_items(topic, difficulty)
+    return {
+        "topic": topic,
+        "item_count": len(items),
+        "items": [item.summary() for item in items]
+    }
+
+# FASTAPI APP
+app = build_app(
+    title="HashProof MCQ Assessment System",
+    description="AI-powered MCQ assessment system using DeepSeek",
+    service_type="MCQ Assessment",
+    features=FEATURES,
+    routers=[router],
+    snapshot_name="mcq_service",
+    snapshot_components={"item_bank": ITEM_BANK}
+)
 
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
@@ -0,0 +1,18 @@
+"""
+HashProof Metrics
+Process-wide counters shared by every module, exposed through /metrics
+"""
+
+from typing import Dict
+
+class Metrics:
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+
+    def incr(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, float]:
+        return dict(sorted(self.counters.items()))
+
+METRICS = Metrics()
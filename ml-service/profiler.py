@@ -0,0 +1,58 @@
+"""
+HashProof Sampling Profiler
+Samples every thread's stack of the live process at a fixed interval and aggregates them
+into collapsed stacks ("root;caller;callee count" lines), ready for flamegraph.pl or speedscope
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+# CONFIGURATION
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.005
+MAX_PROFILE_SECONDS = 60.0
+MAX_STACK_DEPTH = 128
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(frame) -> List[str]:
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_SAMPLE_INTERVAL_SECONDS,
+                  thread_ids: Optional[Set[int]] = None) -> Dict:
+    """Blocking: sample `thread_ids` (default: every other thread) for `seconds`.
+
+    Run it in a worker thread (asyncio.to_thread) so the event loop keeps serving while it is
+    profiled. The calling thread is never sampled; each stack is rooted at its thread's name.
+    """
+    seconds = max(0.1, min(seconds, MAX_PROFILE_SECONDS))
+    own_id = threading.get_ident()
+    counts: Counter = Counter()
+    samples = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or (thread_ids is not None and thread_id not in thread_ids):
+                continue
+            stack = [names.get(thread_id, f"thread-{thread_id}")] + _collapse(frame)
+            counts[";".join(stack)] += 1
+        samples += 1
+        time.sleep(interval)
+    return {
+        "seconds": round(time.perf_counter() - started, 3),
+        "samples": samples,
+        "interval_ms": interval * 1000,
+        "collapsed": "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n",
+    }
@@ -0,0 +1,139 @@
+"""
+HashProof Prompt Templates
+Versioned prompts compiled once: static instructions form a stable prefix, per-call values go last
+"""
+
+import hashlib
+import string
+from typing import Dict, List, Optional
+
+class PromptTemplate:
+    """One prompt: a fixed instruction block followed by a `str.format` tail of per-call values.
+
+    Keeping everything that varies in the tail makes every call of a template share the same
+    leading tokens, which providers with prefix (KV) caching can reuse. `key` identifies the
+    exact wording, so caches keyed on it are invalidated whenever the template changes.
+    """
+
+    __slots__ = ("name", "version", "prefix", "tail", "fields", "key",
+                 "calls", "prompt_tokens", "cached_prompt_tokens")
+
+    def __init__(self, name: str, version: int, prefix: str, tail: str):
+        self.name = name
+        self.version = version
+        self.prefix = prefix.strip() + "\n\n"
+        self.tail = tail.strip()
+        self.fields = frozenset(f for _, f, _, _ in string.Formatter().parse(self.tail) if f)
+        digest = hashlib.sha1(f"{self.prefix}\0{self.tail}".encode()).hexdigest()[:8]
+        self.key = f"{name}@v{version}:{digest}"
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def render(self, **values) -> "RenderedPrompt":
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt {self.name} is missing values for {sorted(missing)}")
+        return RenderedPrompt(self, self.prefix + self.tail.format(**values))
+
+    def record_usage(self, prompt_tokens: int, cached_prompt_tokens: int):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_prompt_tokens += cached_prompt_tokens
+
+    def report(self) -> Dict:
+        return {
+            "key": self.key,
+            "prefix_chars": len(self.prefix),
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "prefix_reuse_ratio": round(self.cached_prompt_tokens / self.prompt_tokens, 3) if self.prompt_tokens else None,
+        }
+
+class RenderedPrompt:
+    __slots__ = ("template", "text")
+
+    def __init__(self, template: PromptTemplate, text: str):
+        self.template = template
+        self.text = text
+
+# Sent as a single user message: DeepSeek-R1 is documented to work best without a system prompt
+MCQ_GENERATION = PromptTemplate("mcq_generation", 2, prefix="""
+You write multiple choice questions for programming assessments.
+
+Return ONLY a JSON object with this exact format:
+
+{"questions": [{"id": "q1", "question": "What is a variable in Python?", "options": {"A": "Stores data", "B": "Wrong answer", "C": "Also wrong", "D": "Wrong too"}, "correct": "A", "points": 2, "explanation": "Variables store data values"}]}
+
+Requirements:
+- Questions about the requested language's programming
+- Difficulty matches the requested level
+- Each question worth 2-4 points based on difficulty
+- Options must use A, B, C, D format
+- Include brief explanations
+- Never repeat a question listed as already written
+
+JSON object only, no other text.
+""", tail="""
+Language: {topic}
+Difficulty: {difficulty} level
+Number of questions: {count}
+Already written: {existing}
+""")
+
+CODE_GENERATION = PromptTemplate("code_generation", 3, prefix="""
+You write coding questions for programming assessments.
+
+Return ONLY a JSON object with this exact format:
+
+{"questions": [{"id": "c1", "question": "Write a function that adds two numbers", "template": "<the starter template below>", "solution": "// Example solution", "points": 5, "test_cases": [{"input": "add(2,3)", "expected": "5"}]}]}
+
+Requirements:
+- Questions about the requested language's programming
+- Difficulty matches the requested level
+- Include template code for student to fill, based on the starter template
+- Include a complete, working reference solution
+- Include test cases to validate solution: each "input" is a call of the solution's function in the requested language, and each "expected" is the exact return value written as a literal of that language
+- Every test case must pass when run against the reference solution
+- Points: 5-10 each based on difficulty
+- Never repeat a question listed as already written
+
+JSON object only, no other text.
+""", tail="""
+Language: {topic}
+Difficulty: {difficulty} level
+Number of questions: {count}
+Starter template: {template}
+Already written: {existing}
+""")
+
+CODE_GRADING = PromptTemplate("code_grading", 1, prefix="""
+Grade the student's coding solution below from 0-10.
+
+Evaluate based on:
+1. Correctness of logic (40%)
+2. Code quality and style (30%)
+3. Completeness (30%)
+
+Respond with: SCORE: X/10
+Then provide brief feedback explaining the score.
+""", tail="""
+Question: {question}
+Expected solution approach: {solution}
+Student submitted code:
+{code}
+""")
+
+TEMPLATES: List[PromptTemplate] = [MCQ_GENERATION, CODE_GENERATION, CODE_GRADING]
+
+def report() -> Dict[str, Dict]:
+    return {t.name: t.report() for t in TEMPLATES}
+
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens the provider served from its prefix cache, when it reports them"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached: Optional[int] = getattr(details, "cached_tokens", None)
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)  # DeepSeek's native field
+    return cached or 0
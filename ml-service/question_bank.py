@@ -0,0 +1,151 @@
+"""
+HashProof Question Bank
+Built-in questions for every supported topic, compiled from data/question_bank.json into an indexed,
+memory-mapped file (the snapshot container format) that worker processes share through the page cache
+
+Usage: python question_bank.py [--source data/question_bank.json] [--out data/question_bank.bank]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+import orjson
+from question_models import SchemaError, validate_raw_code, validate_raw_mcq
+from snapshot import Snapshot, SnapshotError, write_snapshot
+
+# CONFIGURATION
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUESTION_BANK_SOURCE = os.getenv("QUESTION_BANK_SOURCE", os.path.join(HERE, "data", "question_bank.json"))
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH", os.path.join(HERE, "data", "question_bank.bank"))
+DEFAULT_TOPIC = "JavaScript"  # unknown topics get these questions, as before
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+META_NAMESPACE = "__meta__"
+
+VALIDATORS = {"mcq": validate_raw_mcq, "code": validate_raw_code}
+
+def _namespace(type: str, topic: str, difficulty: str) -> str:
+    return f"{type}/{topic.lower()}/{difficulty}"
+
+def _source_digest(source: str) -> str:
+    with open(source, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _records(data: Dict, digest: str) -> Iterator[Tuple[str, str, bytes]]:
+    for type, topics in data.items():
+        validate = VALIDATORS[type]
+        for topic, by_difficulty in topics.items():
+            for difficulty, questions in by_difficulty.items():
+                if difficulty not in DIFFICULTIES:
+                    raise ValueError(f"{type}/{topic}: unknown difficulty {difficulty!r}")
+                for i, question in enumerate(questions):
+                    try:
+                        validate(question)
+                    except SchemaError as e:
+                        raise ValueError(f"{type}/{topic}/{difficulty} #{i + 1}: {e}")
+                    yield _namespace(type, topic, difficulty), str(i), orjson.dumps(question)
+    yield META_NAMESPACE, "source", orjson.dumps({"sha256": digest})
+
+def build_bank(source: str = QUESTION_BANK_SOURCE, path: str = QUESTION_BANK_PATH) -> int:
+    """Compile the JSON question source into a bank file; returns the number of questions"""
+    with open(source, "rb") as f:
+        raw = f.read()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    written = write_snapshot(path, _records(orjson.loads(raw), hashlib.sha256(raw).hexdigest()))
+    return written - 1  # minus the meta record
+
+class QuestionBank:
+    """Read side of the bank: O(1) lookup of a (type, topic, difficulty) bucket, random sampling within it.
+
+    Only the index is decoded at open; each question is decompressed from the mapping when sampled.
+    The file is rebuilt first if it is missing or was built from a different version of the source,
+    in the temp directory instead when its own location is read-only (e.g. a container image that was
+    built without running `python question_bank.py`).
+    """
+
+    def __init__(self, path: str = QUESTION_BANK_PATH, source: str = QUESTION_BANK_SOURCE):
+        self.path = path
+        self.source = source
+        self.snapshot: Optional[Snapshot] = None
+
+    def _stale(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return True
+        if not os.path.exists(self.source):
+            return False
+        try:
+            snapshot = Snapshot(path)
+        except SnapshotError:
+            return True
+        try:
+            meta = snapshot.read(META_NAMESPACE, "source")
+            return meta is None or orjson.loads(meta)["sha256"] != _source_digest(self.source)
+        finally:
+            snapshot.close()
+
+    def open(self) -> Snapshot:
+        if self.snapshot is None:
+            if self._stale(self.path):
+                self.path = self._build()
+            self.snapshot = Snapshot(self.path)
+        return self.snapshot
+
+    def _build(self) -> str:
+        """Compile the bank; returns where it was written"""
+        try:
+            count = build_bank(self.source, self.path)
+            print(f"📚 Built question bank with {count} questions at {self.path}")
+            return self.path
+        except OSError as e:
+            # Named by source version, so workers and restarts on this machine reuse one build
+            fallback = os.path.join(tempfile.gettempdir(), f"hashproof-question-bank-{_source_digest(self.source)[:12]}.bank")
+            print(f"⚠️  Cannot write question bank at {self.path} ({e}); using {fallback}")
+            if self._stale(fallback):
+                count = build_bank(self.source, fallback)
+                print(f"📚 Built question bank with {count} questions at {fallback}")
+            return fallback
+
+    def count(self, type: str, topic: str, difficulty: str) -> int:
+        return self.open().count(_namespace(type, topic, difficulty))
+
+    def _resolve(self, type: str, topic: str, difficulty: str) -> Optional[str]:
+        """Bucket to draw from: the exact one, else the topic's nearest difficulty, else the default topic"""
+        snapshot = self.open()
+        order = sorted(DIFFICULTIES, key=lambda d: abs(DIFFICULTIES.index(d) - DIFFICULTIES.index(difficulty))) \
+            if difficulty in DIFFICULTIES else list(DIFFICULTIES)
+        for candidate_topic in (topic, DEFAULT_TOPIC):
+            for candidate in order:
+                namespace = _namespace(type, candidate_topic, candidate)
+                if snapshot.count(namespace):
+                    return namespace
+        return None
+
+    def sample(self, type: str, topic: str, difficulty: str, count: int) -> List[Dict]:
+        """`count` questions in random order; repeats only once the bucket is exhausted"""
+        namespace = self._resolve(type, topic, difficulty)
+        if namespace is None:
+            return []
+        snapshot = self.snapshot
+        available = snapshot.count(namespace)
+        order = random.sample(range(available), available)
+        return [orjson.loads(snapshot.read(namespace, str(order[i % available]))) for i in range(count)]
+
+    def close(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+QUESTION_BANK = QuestionBank()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", default=QUESTION_BANK_SOURCE)
+    parser.add_argument("--out", default=QUESTION_BANK_PATH)
+    args = parser.parse_args()
+    count = build_bank(args.source, args.out)
+    print(f"📚 Wrote {count} questions to {args.out}")
+
+if __name__ == "__main__":
+    main()
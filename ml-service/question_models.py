@@ -0,0 +1,235 @@
+"""
+HashProof Question Models
+Typed question and test records, validated once on entry and served as pre-serialized JSON
+"""
+
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import orjson
+
+OPTION_KEYS = ("A", "B", "C", "D")
+REQUIRED = object()
+
+class SchemaError(ValueError):
+    """Raised when raw question data cannot be turned into a valid question"""
+
+def compile_schema(fields: Dict[str, Tuple[tuple, Any]]) -> Callable[[Any], Dict]:
+    """Compile a {name: (accepted_types, default)} spec into a validator function.
+
+    The spec is flattened once so validating a record is a single tight loop. Fields that are
+    missing or of the wrong type take their default (None means "let the caller decide");
+    a REQUIRED default raises SchemaError instead.
+    """
+    spec = tuple((name, types, default) for name, (types, default) in fields.items())
+
+    def validate(raw: Any) -> Dict:
+        if not isinstance(raw, dict):
+            raise SchemaError(f"expected an object, got {type(raw).__name__}")
+        out = {}
+        for name, types, default in spec:
+            value = raw.get(name)
+            if value is None or isinstance(value, bool) or not isinstance(value, types):
+                if default is REQUIRED:
+                    raise SchemaError(f"missing or invalid field '{name}'")
+                value = default
+            out[name] = value
+        return out
+
+    return validate
+
+validate_raw_mcq = compile_schema({
+    "question": ((str,), None),
+    "options": ((dict, list), REQUIRED),
+    "correct": ((str,), "A"),
+    "points": ((int, float), None),
+    "explanation": ((str,), "Check the documentation for details"),
+})
+
+validate_raw_code = compile_schema({
+    "question": ((str,), None),
+    "template": ((str,), None),
+    "solution": ((str,), "// Solution code here"),
+    "points": ((int, float), None),
+    "test_cases": ((list,), None),
+})
+
+def _normalize_options(options: Any) -> Dict[str, str]:
+    if isinstance(options, list):
+        # Some responses list options as ["A) foo", "B) bar", ...]
+        options = {
+            OPTION_KEYS[idx]: (opt.split(") ", 1)[-1] if ") " in opt else opt)
+            for idx, opt in enumerate(options[:4]) if isinstance(opt, str)
+        }
+    if not all(key in options for key in OPTION_KEYS):
+        raise SchemaError("missing required options A-D")
+    return {key: str(options[key]) for key in OPTION_KEYS}
+
+class MCQQuestion:
+    __slots__ = ("id", "question", "options", "correct", "points", "explanation", "item_key")
+
+    def __init__(self, id: str, question: str, options: Dict[str, str], correct: str,
+                 points: int, explanation: str, item_key: Optional[str] = None):
+        self.id = id
+        self.question = question
+        self.options = options
+        self.correct = correct
+        self.points = points
+        self.explanation = explanation
+        self.item_key = item_key
+
+    @classmethod
+    def from_llm(cls, raw: Any, question_id: str, topic: str, default_points: int) -> "MCQQuestion":
+        """Validate one question object from the AI response, filling safe defaults"""
+        data = validate_raw_mcq(raw)
+        correct = data["correct"].strip().upper()
+        return cls(
+            id=question_id,
+            question=data["question"] or f"What is an important concept in {topic}?",
+            options=_normalize_options(data["options"]),
+            correct=correct if correct in OPTION_KEYS else "A",
+            points=int(data["points"]) if data["points"] is not None else default_points,
+            explanation=data["explanation"],
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MCQQuestion":
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def copy(self, **changes) -> "MCQQuestion":
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return MCQQuestion(**fields)
+
+    def to_dict(self) -> Dict:
+        data = {
+            "id": self.id,
+            "question": self.question,
+            "options": self.options,
+            "correct": self.correct,
+            "points": self.points,
+            "explanation": self.explanation,
+        }
+        if self.item_key:
+            data["item_key"] = self.item_key
+        return data
+
+def _normalize_test_cases(test_cases: Any) -> List[Dict]:
+    """Keep {"input", "expected"} cases with a string call expression; non-string expectations become JSON literals"""
+    cases = []
+    for tc in test_cases or []:
+        if not isinstance(tc, dict) or not isinstance(tc.get("input"), str) or tc.get("expected") is None:
+            continue
+        expected = tc["expected"]
+        cases.append({"input": tc["input"], "expected": expected if isinstance(expected, str) else orjson.dumps(expected).decode()})
+    if not cases:
+        raise SchemaError("no usable test cases")
+    return cases
+
+class CodeQuestion:
+    __slots__ = ("id", "question", "template", "solution", "points", "test_cases", "verified")
+
+    def __init__(self, id: str, question: str, template: str, solution: str,
+                 points: int, test_cases: List[Dict], verified: Optional[bool] = None):
+        self.id = id
+        self.question = question
+        self.template = template
+        self.solution = solution
+        self.points = points
+        self.test_cases = test_cases
+        self.verified = verified  # True once the solution reproduced every expected output in the sandbox
+
+    @classmethod
+    def from_llm(cls, raw: Any, question_id: str, topic: str, template: str, default_points: int) -> "CodeQuestion":
+        """Validate one question object from the AI response, filling safe defaults"""
+        data = validate_raw_code(raw)
+        return cls(
+            id=question_id,
+            question=data["question"] or f"Write a {topic} function",
+            template=data["template"] or template,
+            solution=data["solution"],
+            points=int(data["points"]) if data["points"] is not None else default_points,
+            test_cases=_normalize_test_cases(data["test_cases"]),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CodeQuestion":
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def copy(self, **changes) -> "CodeQuestion":
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return CodeQuestion(**fields)
+
+    def to_dict(self) -> Dict:
+        data = {
+            "id": self.id,
+            "question": self.question,
+            "template": self.template,
+            "solution": self.solution,
+            "points": self.points,
+            "test_cases": self.test_cases,
+        }
+        if self.verified is not None:
+            data["verified"] = self.verified
+        return data
+
+_PAYLOAD_FIELDS = {"test_id", "type", "topic", "difficulty", "questions", "total_points", "question_count"}
+
+class StoredTest:
+    """A generated test as kept in TEST_STORAGE; immutable once created, so its JSON is cached"""
+
+    __slots__ = ("test_id", "type", "topic", "difficulty", "questions", "total_points",
+                 "extra", "_lookup", "_payload")
+
+    def __init__(self, test_id: str, type: str, topic: str, difficulty: str,
+                 questions: List[Any], extra: Optional[Dict] = None):
+        self.test_id = test_id
+        self.type = type
+        self.topic = topic
+        self.difficulty = difficulty
+        self.questions = questions
+        self.total_points = sum(q.points for q in questions)
+        self.extra = extra or {}
+        self._lookup = None
+        self._payload = None
+
+    @classmethod
+    def from_json(cls, payload: bytes) -> "StoredTest":
+        """Rebuild a test from its own payload (e.g. a snapshot record), reusing the bytes as its payload"""
+        data = orjson.loads(payload)
+        question_cls = CodeQuestion if data["type"] == "code" else MCQQuestion
+        extra = {k: v for k, v in data.items() if k not in _PAYLOAD_FIELDS}
+        test = cls(data["test_id"], data["type"], data["topic"], data["difficulty"],
+                   [question_cls.from_dict(q) for q in data["questions"]], extra=extra)
+        test._payload = payload
+        return test
+
+    @property
+    def question_count(self) -> int:
+        return len(self.questions)
+
+    @property
+    def lookup(self) -> Dict[str, Any]:
+        """Question id -> question, built on first use"""
+        if self._lookup is None:
+            self._lookup = {q.id: q for q in self.questions}
+        return self._lookup
+
+    def to_dict(self) -> Dict:
+        data = {
+            "test_id": self.test_id,
+            "type": self.type,
+            "topic": self.topic,
+            "difficulty": self.difficulty,
+            "questions": [q.to_dict() for q in self.questions],
+            "total_points": self.total_points,
+            "question_count": self.question_count,
+        }
+        data.update(self.extra)
+        return data
+
+    @property
+    def payload(self) -> bytes:
+        """JSON body for this test, serialized once and reused for every response"""
+        if self._payload is None:
+            self._payload = orjson.dumps(self.to_dict())
+        return self._payload
@@ -0,0 +1,170 @@
+"""
+HashProof Upstream Rate Limiting
+Token buckets for the provider's requests-per-minute and tokens-per-minute quotas, shared by every
+caller in the process, plus the jittered backoff used when the provider still answers 429/5xx
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from config import UPSTREAM_RPM, UPSTREAM_TPM
+from metrics import METRICS
+
+# CONFIGURATION
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 20.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError"}  # openai exception names, matched without importing openai
+
+class RateLimitTimeout(Exception):
+    """The limiter could not admit a call before its deadline"""
+
+class TokenBucket:
+    """Refills continuously at `per_minute`; holds at most one minute's worth"""
+
+    __slots__ = ("rate", "capacity", "level", "updated", "clock")
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity wait for a full bucket)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+class UpstreamLimiter:
+    """Admits upstream calls in arrival order within the RPM and TPM quotas (0 disables a quota).
+
+    A call reserves its estimated prompt tokens plus max_tokens, and the unused part is refunded from
+    the reported usage afterwards. A 429 pauses every caller until its Retry-After has passed.
+    """
+
+    def __init__(self, rpm: float = UPSTREAM_RPM, tpm: float = UPSTREAM_TPM,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.requests = TokenBucket(rpm, clock) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, clock) if tpm > 0 else None
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _delay(self, tokens: int) -> float:
+        delay = max(0.0, self.paused_until - self.clock())
+        if self.requests:
+            delay = max(delay, self.requests.delay_for(1))
+        if self.tokens:
+            delay = max(delay, self.tokens.delay_for(tokens))
+        return delay
+
+    async def acquire(self, tokens: int, timeout: float) -> float:
+        """Wait for quota for one call of about `tokens` tokens; returns the seconds waited"""
+        started = self.clock()
+        async with self._lock:  # asyncio.Lock is FIFO, so large calls are not starved by small ones
+            while True:
+                delay = self._delay(tokens)
+                if delay <= 0:
+                    break
+                if self.clock() - started + delay > timeout:
+                    METRICS.incr("limiter_deadline_exceeded")
+                    raise RateLimitTimeout(f"upstream quota not available within {timeout:.1f}s")
+                await self.sleep(delay)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+
+        waited = self.clock() - started
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            METRICS.incr("limiter_waits")
+            METRICS.incr("limiter_wait_ms", int(waited * 1000))
+        return waited
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Take quota for one call only if it is free right now and no caller is queued; never waits"""
+        if self._lock.locked() or self._delay(tokens) > 0:
+            return False
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+        return True
+
+    def settle(self, reserved: int, used: Optional[int]):
+        """Return the part of a reservation the call did not use"""
+        if self.tokens and used is not None and used < reserved:
+            self.tokens.refund(reserved - used)
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. after the provider answered 429"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def status(self) -> Dict:
+        return {
+            "rpm": self.requests.capacity if self.requests else None,
+            "tpm": self.tokens.capacity if self.tokens else None,
+            "requests_available": round(self.requests.level, 1) if self.requests else None,
+            "tokens_available": int(self.tokens.level) if self.tokens else None,
+            "paused_for_seconds": round(max(0.0, self.paused_until - self.clock()), 2),
+            "waits": self.waits,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "mean_wait_seconds": round(self.wait_seconds_total / self.waits, 3) if self.waits else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+        }
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Reservation for one call: ~4 characters per prompt token plus the completion budget"""
+    return len(prompt) // 4 + max_tokens
+
+def is_retryable(error: Exception) -> bool:
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS or type(error).__name__ in RETRYABLE_ERRORS
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from Retry-After / retry-after-ms"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than the provider's Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    hinted = retry_after(error)
+    return max(delay, hinted) if hinted is not None else delay
+
+UPSTREAM_LIMITER = UpstreamLimiter()
@@ -0,0 +1,226 @@
+"""
+HashProof Service App
+Builds the FastAPI app around one or more assessment routers, sharing the AI client,
+test store, snapshots, metrics and usage tracking of the process
+"""
+
+import asyncio
+import hmac
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from analytics import RESULTS
+from config import DEBUG_TOKEN, HEALTH_PROBE_DEADLINE_SECONDS, MODEL, SNAPSHOT_INTERVAL_SECONDS
+from llm_client import QUOTA_BUSY, ai_client
+from loop_monitor import LoopMonitor
+from profiler import sample_stacks, DEFAULT_SAMPLE_INTERVAL_SECONDS
+from metrics import METRICS
+from usage import USAGE
+from snapshot import SnapshotManager
+from storage import TEST_STORAGE
+from variants import VARIANTS
+from question_bank import QUESTION_BANK
+from webhooks import WEBHOOKS
+from idempotency import GRADINGS
+
+def build_app(title: str, description: str, service_type: str, features: List[str],
+              routers: List[APIRouter], snapshot_name: str, snapshot_components: Dict[str, object] = None,
+              warmup_hooks: List[Callable[[], Awaitable]] = None) -> FastAPI:
+    """Create an app serving `routers` plus the shared root, test, metrics, usage, health and readiness endpoints.
+
+    Startup restores the snapshot before serving, then runs the warm-up hooks (upstream connection first)
+    in the background; /ready answers 503 until they have finished.
+    """
+    snapshots = SnapshotManager(
+        os.getenv("SNAPSHOT_PATH", f"snapshots/{snapshot_name}.snap"),
+        SNAPSHOT_INTERVAL_SECONDS
+    )
+    snapshots.register("tests", TEST_STORAGE)
+    snapshots.register("analytics", RESULTS)
+    snapshots.register("variants", VARIANTS)
+    snapshots.register("gradings", GRADINGS)
+    results_log_path = os.getenv("RESULTS_LOG_PATH", f"results/{snapshot_name}.jsonl")
+    webhook_outbox_dir = os.getenv("WEBHOOK_OUTBOX_DIR", f"results/{snapshot_name}-outbox")
+    for namespace, component in (snapshot_components or {}).items():
+        snapshots.register(namespace, component)
+
+    loop_monitor = LoopMonitor()
+    profile_lock = asyncio.Lock()
+
+    hooks = [ai_client.warm_up] + list(warmup_hooks or [])
+
+    async def warm_up(app: FastAPI):
+        started = time.perf_counter()
+        for hook in hooks:
+            try:
+                await hook()
+            except Exception as e:
+                print(f"⚠️  Warm-up step {getattr(hook, '__qualname__', hook)} failed: {e}")
+        app.state.warmup_seconds = time.perf_counter() - started
+        app.state.ready = True
+        print(f"✅ Warm-up finished in {app.state.warmup_seconds:.2f}s, ready for traffic")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        QUESTION_BANK.open()
+        RESULTS.open(results_log_path)
+        snapshots.restore()
+        RESULTS.catch_up()
+        WEBHOOKS.start(webhook_outbox_dir)
+        snapshots.start()
+        loop_monitor.start()
+        warmup_task = asyncio.create_task(warm_up(app))
+        yield
+        warmup_task.cancel()
+        await loop_monitor.stop()
+        await WEBHOOKS.stop()
+        await snapshots.stop()
+
+    app = FastAPI(
+        title=title,
+        description=description,
+        version="1.0.0",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
+    )
+    app.state.snapshots = snapshots
+    app.state.loop_monitor = loop_monitor
+    app.state.ready = False
+    app.state.warmup_seconds = None
+
+    @app.get("/")
+    async def root():
+        return {
+            "message": f"{title} is running!",
+            "status": "healthy",
+            "ai_model": MODEL,
+            "type": service_type,
+            "features": features
+        }
+
+    for router in routers:
+        app.include_router(router)
+
+    @app.get("/test/{test_id}")
+    async def get_test(test_id: str):
+        """Retrieve a test, or a student's variant of one, by ID"""
+        variant = VARIANTS.get(test_id)
+        test_data = TEST_STORAGE.get(variant.base_test_id if variant else test_id)
+        if not test_data:
+            raise HTTPException(status_code=404, detail="Test not found")
+        if variant:
+            test_data = variant.render(test_data)
+        return Response(content=test_data.payload, media_type="application/json")
+
+    @app.get("/results/export")
+    async def export_results(cursor: int = 0, limit: int = 1000, topic: Optional[str] = None,
+                             test_id: Optional[str] = None):
+        """One page of the graded results log as NDJSON; pass X-Next-Cursor back as `cursor` for the next page"""
+        if limit < 1 or limit > 10000:
+            raise HTTPException(status_code=400, detail="Limit must be between 1 and 10000")
+        if cursor < 0:
+            raise HTTPException(status_code=400, detail="Cursor must not be negative")
+
+        try:
+            lines, next_cursor = await asyncio.to_thread(RESULTS.read_page, cursor, limit, topic, test_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else {}
+        return StreamingResponse(iter(lines), media_type="application/x-ndjson", headers=headers)
+
+    @app.get("/analytics")
+    async def get_analytics(test_id: Optional[str] = None, topic: Optional[str] = None,
+                            difficulty: Optional[str] = None):
+        """Score distribution, grade buckets and pass rate for a test, topic and/or difficulty"""
+        RESULTS.catch_up()  # results other workers logged since this one last wrote
+        if test_id:
+            dimension, key = "test", test_id
+        elif topic and difficulty:
+            dimension, key = "topic_difficulty", f"{topic}|{difficulty}"
+        elif topic:
+            dimension, key = "topic", topic
+        elif difficulty:
+            dimension, key = "difficulty", difficulty
+        else:
+            return {
+                "overall": RESULTS.summary(),
+                "by_topic": RESULTS.breakdown("topic"),
+                "by_difficulty": RESULTS.breakdown("difficulty")
+            }
+
+        summary = RESULTS.summary(dimension, key)
+        if summary is None:
+            raise HTTPException(status_code=404, detail="No graded results for this selection")
+        return summary
+
+    @app.get("/metrics")
+    async def get_metrics():
+        """Process-wide counters"""
+        return METRICS.snapshot()
+
+    @app.get("/usage")
+    async def get_usage():
+        """Token usage and cost per call kind/topic/difficulty, the current adaptive budgets and prompt prefix reuse"""
+        return USAGE.report()
+
+    @app.get("/ready")
+    async def readiness_check():
+        """Readiness probe: 503 until startup warm-up has finished"""
+        body = {"ready": app.state.ready, "warmup_seconds": app.state.warmup_seconds}
+        return ORJSONResponse(body, status_code=200 if app.state.ready else 503)
+
+    @app.get("/debug/profile")
+    async def debug_profile(seconds: float = 10.0, interval_ms: float = DEFAULT_SAMPLE_INTERVAL_SECONDS * 1000,
+                            all_threads: bool = False, x_debug_token: Optional[str] = Header(None)):
+        """Sample the live process for `seconds` and return collapsed stacks (text/plain, one "stack count" per line).
+
+        Requires DEBUG_TOKEN to be configured and sent as X-Debug-Token. Samples the event loop thread
+        only unless `all_threads` is set.
+        """
+        if not DEBUG_TOKEN:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if not x_debug_token or not hmac.compare_digest(x_debug_token, DEBUG_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid debug token")
+        if profile_lock.locked():
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        async with profile_lock:
+            thread_ids = None if all_threads else {threading.get_ident()}
+            profile = await asyncio.to_thread(sample_stacks, seconds, max(0.001, interval_ms / 1000), thread_ids)
+        return Response(
+            content=profile["collapsed"],
+            media_type="text/plain",
+            headers={"X-Profile-Samples": str(profile["samples"]), "X-Profile-Seconds": str(profile["seconds"])}
+        )
+
+    @app.get("/health")
+    async def health_check():
+        """Health check endpoint"""
+        try:
+            # Never queues behind gradings or waits out a 429 pause: a busy quota skips the probe
+            test_response = await ai_client.ask_ai("Say 'OK' if you can respond", max_tokens=10, kind="health",
+                                                   deadline=HEALTH_PROBE_DEADLINE_SECONDS, wait_for_quota=False)
+            quota_busy = test_response == QUOTA_BUSY
+            ai_healthy = quota_busy or "OK" in test_response or "ok" in test_response.lower()
+
+            return {
+                "status": "healthy" if ai_healthy else "degraded",
+                "ai_connection": "quota_busy" if quota_busy else "connected" if ai_healthy else "issues",
+                "model": MODEL,
+                "tests_in_memory": len(TEST_STORAGE),
+                "snapshot": snapshots.status(),
+                "event_loop": loop_monitor.status(),
+                "webhooks": WEBHOOKS.status(),
+                "type": f"{service_type} System"
+            }
+        except Exception as e:
+            return {
+                "status": "unhealthy",
+                "error": str(e),
+                "ai_connection": "failed"
+            }
+
+    return app
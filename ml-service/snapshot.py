@@ -0,0 +1,259 @@
+"""
+HashProof State Snapshots
+Periodic and on-shutdown snapshots of in-memory state, memory-mapped and lazily read on startup
+
+File layout (little endian):
+    header   magic "HPSNAP" | u16 format version | u64 index offset | u64 index length | u32 index crc32
+    records  zlib-compressed JSON blobs, back to back
+    index    zlib-compressed JSON list of [namespace, key, offset, length, crc32]
+
+Only the header and index are read at startup; records are decompressed and crc-checked on first access,
+so boot time stays flat as the snapshot grows.
+"""
+
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import orjson
+
+MAGIC = b"HPSNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<6sHQQI")
+MAX_WORKER_SLOTS = 64
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is unreadable, from another format version, or corrupt"""
+
+class StoredRecord:
+    """A record still sitting compressed in an open snapshot, copied through verbatim on rewrite"""
+
+    __slots__ = ("snapshot", "offset", "length", "crc")
+
+    def __init__(self, snapshot: "Snapshot", offset: int, length: int, crc: int):
+        self.snapshot = snapshot
+        self.offset = offset
+        self.length = length
+        self.crc = crc
+
+    def read_compressed(self) -> bytes:
+        return self.snapshot.mm[self.offset:self.offset + self.length]
+
+Record = Union[bytes, StoredRecord]  # plain bytes are uncompressed JSON
+
+class Snapshot:
+    """Read-only view over a memory-mapped snapshot file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"{path} is empty")
+
+        try:
+            magic, version, index_offset, index_length, index_crc = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path} is not a snapshot file")
+            if version != FORMAT_VERSION:
+                raise SnapshotError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+            raw_index = self.mm[index_offset:index_offset + index_length]
+            if zlib.crc32(raw_index) != index_crc:
+                raise SnapshotError(f"{path} index checksum mismatch")
+            entries = orjson.loads(zlib.decompress(raw_index))
+        except (struct.error, zlib.error, orjson.JSONDecodeError) as e:
+            self.close()
+            raise SnapshotError(f"{path} is corrupt: {e}")
+        except SnapshotError:
+            self.close()
+            raise
+
+        self.index: Dict[str, Dict[str, StoredRecord]] = {}
+        for namespace, key, offset, length, crc in entries:
+            self.index.setdefault(namespace, {})[key] = StoredRecord(self, offset, length, crc)
+
+    def keys(self, namespace: str) -> List[str]:
+        return list(self.index.get(namespace, {}))
+
+    def count(self, namespace: str) -> int:
+        return len(self.index.get(namespace, {}))
+
+    def record(self, namespace: str, key: str) -> Optional[StoredRecord]:
+        return self.index.get(namespace, {}).get(key)
+
+    def read(self, namespace: str, key: str) -> Optional[bytes]:
+        """Decompressed JSON bytes for one record; raises SnapshotError if it fails its checksum"""
+        record = self.record(namespace, key)
+        if record is None:
+            return None
+        compressed = record.read_compressed()
+        if zlib.crc32(compressed) != record.crc:
+            raise SnapshotError(f"record {namespace}/{key} checksum mismatch")
+        return zlib.decompress(compressed)
+
+    def close(self):
+        try:
+            self.mm.close()
+        except (AttributeError, BufferError):
+            pass
+        self._file.close()
+
+def write_snapshot(path: str, records: Iterable[Tuple[str, str, Record]]) -> int:
+    """Write records to `path` atomically (temp file + rename). Returns the number of records written."""
+    tmp_path = f"{path}.{os.getpid()}.{time.time_ns()}.tmp"
+    entries = []
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        offset = HEADER.size
+        for namespace, key, record in records:
+            if isinstance(record, StoredRecord):
+                compressed, crc = record.read_compressed(), record.crc
+            else:
+                compressed = zlib.compress(record, 1)
+                crc = zlib.crc32(compressed)
+            f.write(compressed)
+            entries.append((namespace, key, offset, len(compressed), crc))
+            offset += len(compressed)
+
+        raw_index = zlib.compress(orjson.dumps(entries), 1)
+        f.write(raw_index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, offset, len(raw_index), zlib.crc32(raw_index)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(entries)
+
+def claim_slot(path_for: Callable[[int], str], limit: int = MAX_WORKER_SLOTS) -> Tuple[str, int]:
+    """First of path_for(0), path_for(1), ... whose `.lock` sibling this process can lock exclusively.
+
+    Returns (path, lock fd). The lock lasts until the fd is closed or the process exits, so every worker
+    of a multi-process deployment gets a file of its own and a restarted worker takes over a free one.
+    """
+    for slot in range(limit):
+        path = path_for(slot)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return path, fd
+    raise RuntimeError(f"All {limit} slots for {path_for(0)} are locked by other processes")
+
+def slot_path(path: str, slot: int) -> str:
+    """`path` itself for slot 0, `name-<slot>.ext` beside it for the others"""
+    if slot == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{slot}{ext}"
+
+class SnapshotManager:
+    """Ties snapshot-aware components to one file and keeps it fresh.
+
+    A component implements `dump_snapshot() -> Iterable[(key, Record)]` and `load_snapshot(snapshot, namespace)`.
+    `load_snapshot` is called again after every save with the new file, so components that keep records
+    undecoded must re-point them at it. Each worker process claims its own file (see claim_slot).
+    """
+
+    def __init__(self, path: str, interval: float):
+        self.base_path = path
+        self.path = path
+        self.interval = interval
+        self.components: Dict[str, object] = {}
+        self.snapshot: Optional[Snapshot] = None
+        self.last_written: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._slot_fd: Optional[int] = None
+
+    def register(self, namespace: str, component):
+        self.components[namespace] = component
+
+    def restore(self):
+        """Claim this worker's snapshot file and attach it (if any) to every registered component"""
+        if self._slot_fd is None:
+            self.path, self._slot_fd = claim_slot(lambda slot: slot_path(self.base_path, slot))
+        if not os.path.exists(self.path):
+            print(f"💾 No snapshot at {self.path}, starting cold")
+            return
+        try:
+            self.snapshot = Snapshot(self.path)
+        except (OSError, SnapshotError) as e:
+            print(f"⚠️  Ignoring unusable snapshot: {e}")
+            return
+        self._attach(self.snapshot)
+        counts = {ns: len(self.snapshot.keys(ns)) for ns in self.components}
+        print(f"💾 Restored snapshot {self.path}: {counts}")
+
+    def _attach(self, snapshot: Snapshot):
+        for namespace, component in self.components.items():
+            component.load_snapshot(snapshot, namespace)
+
+    def _collect(self) -> List[Tuple[str, str, Record]]:
+        return [
+            (namespace, key, record)
+            for namespace, component in self.components.items()
+            for key, record in component.dump_snapshot()
+        ]
+
+    async def save(self):
+        """Write a fresh snapshot; record bytes are gathered on the loop, compression and I/O run in a thread"""
+        async with self._lock:
+            records = self._collect()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            started = time.perf_counter()
+            count = await asyncio.to_thread(write_snapshot, self.path, records)
+
+            # Lazily loaded entries now point into the new file, so the old mapping can go
+            previous, self.snapshot = self.snapshot, Snapshot(self.path)
+            self._attach(self.snapshot)
+            if previous:
+                previous.close()
+            self.last_written = time.time()
+            print(f"💾 Snapshot written: {count} records in {time.perf_counter() - started:.2f}s")
+
+    async def _run_periodic(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except Exception as e:
+                print(f"❌ Periodic snapshot failed: {e}")
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run_periodic())
+
+    async def stop(self):
+        """Stop the periodic task and write a final snapshot"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.save()
+        except Exception as e:
+            print(f"❌ Shutdown snapshot failed: {e}")
+        if self.snapshot:
+            self.snapshot.close()
+            self.snapshot = None
+        if self._slot_fd is not None:
+            os.close(self._slot_fd)
+            self._slot_fd = None
+
+    def status(self) -> Dict:
+        return {
+            "path": self.path,
+            "interval_seconds": self.interval,
+            "last_written": self.last_written,
+        }
@@ -0,0 +1,80 @@
+"""
+HashProof Snapshot LRU
+Bounded LRU shared by the caches that are saved with the state snapshot; restored entries stay compressed
+in the snapshot until first looked up
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Iterable, Iterator, Optional, Tuple, TypeVar
+from metrics import METRICS
+from snapshot import Record, Snapshot, SnapshotError
+
+V = TypeVar("V")
+
+class SnapshotLRU(Generic[V]):
+    """LRU of up to `max_entries` values, stored in snapshots as `encode(value)` and read back with `decode`.
+
+    Lookups count `<metric>_hits` / `<metric>_misses`.
+    """
+
+    def __init__(self, max_entries: int, encode: Callable[[V], bytes], decode: Callable[[bytes], V], metric: str):
+        self.max_entries = max_entries
+        self.encode = encode
+        self.decode = decode
+        self.metric = metric
+        self.entries: "OrderedDict[str, V]" = OrderedDict()
+        self._snapshot: Optional[Snapshot] = None
+        self._namespace = ""
+        self._lazy: Dict[str, None] = {}  # snapshot keys not decoded yet, oldest first
+
+    def get(self, key: str) -> Optional[V]:
+        value = self.entries.get(key)
+        if value is None and key in self._lazy:
+            value = self._load(key)
+        if value is None:
+            METRICS.incr(f"{self.metric}_misses")
+            return None
+        self.entries.move_to_end(key)
+        METRICS.incr(f"{self.metric}_hits")
+        return value
+
+    def _load(self, key: str) -> Optional[V]:
+        del self._lazy[key]
+        try:
+            value = self.decode(self._snapshot.read(self._namespace, key))
+        except (SnapshotError, ValueError) as e:
+            print(f"⚠️  Skipping {self.metric.replace('_', ' ')} record {key}: {e}")
+            return None
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value: V):
+        if self.max_entries <= 0:
+            return
+        self._lazy.pop(key, None)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def keys(self) -> Iterator[str]:
+        """Every key, decoded or not, least recently used first"""
+        yield from self._lazy
+        yield from self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries) + len(self._lazy)
+
+    def dump_snapshot(self) -> Iterable[Tuple[str, Record]]:
+        # Untouched snapshot entries are older than anything used since: they go first and are trimmed first
+        lazy = list(self._lazy)
+        for key in lazy[max(0, len(lazy) - max(0, self.max_entries - len(self.entries))):]:
+            yield key, self._snapshot.record(self._namespace, key)
+        for key, value in self.entries.items():
+            yield key, self.encode(value)
+
+    def load_snapshot(self, snapshot: Snapshot, namespace: str):
+        """Point undecoded entries at `snapshot`; they are read on first lookup"""
+        self._snapshot = snapshot
+        self._namespace = namespace
+        self._lazy = dict.fromkeys(key for key in snapshot.keys(namespace) if key not in self.entries)
@@ -0,0 +1,99 @@
+"""
+HashProof Startup Benchmark
+Measures module import time and boot-to-ready time of each app entry point
+
+Usage: python startup_benchmark.py [--runs 5] [--modules mcq_service code_assesment_service assessment_service]
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+READY_TIMEOUT_SECONDS = 60.0
+
+IMPORT_PROBE = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+def measure_import(module: str) -> float:
+    """Import time of `module` in a fresh interpreter"""
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE.format(module=module)],
+        cwd=HERE, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _get_status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def measure_boot(module: str) -> dict:
+    """Seconds from process spawn until the app accepts connections and until /ready returns 200"""
+    port = _free_port()
+    snapshot_dir = tempfile.mkdtemp(prefix="hashproof-bench-")
+    env = dict(os.environ, SNAPSHOT_INTERVAL_SECONDS="0", SNAPSHOT_PATH=os.path.join(snapshot_dir, "bench.snap"),
+               RESULTS_LOG_PATH=os.path.join(snapshot_dir, "bench.jsonl"),
+               WEBHOOK_OUTBOX_DIR=os.path.join(snapshot_dir, "outbox"),
+               QUESTION_BANK_PATH=os.path.join(snapshot_dir, "bench.bank"))
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    listening = None
+    try:
+        while time.perf_counter() - started < READY_TIMEOUT_SECONDS:
+            try:
+                status = _get_status(f"http://127.0.0.1:{port}/ready")
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.01)
+                continue
+            if listening is None:
+                listening = time.perf_counter() - started
+            if status == 200:
+                return {"listening": listening, "ready": time.perf_counter() - started}
+            time.sleep(0.01)
+        raise TimeoutError(f"{module} did not become ready within {READY_TIMEOUT_SECONDS}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", nargs="+",
+                        default=["mcq_service", "code_assesment_service", "assessment_service"])
+    args = parser.parse_args()
+
+    print(f"{'module':<26}{'import (s)':>12}{'listening (s)':>15}{'ready (s)':>12}")
+    for module in args.modules:
+        imports = [measure_import(module) for _ in range(args.runs)]
+        boots = [measure_boot(module) for _ in range(args.runs)]
+        print(f"{module:<26}"
+              f"{statistics.median(imports):>12.3f}"
+              f"{statistics.median(b['listening'] for b in boots):>15.3f}"
+              f"{statistics.median(b['ready'] for b in boots):>12.3f}")
+
+if __name__ == "__main__":
+    main()
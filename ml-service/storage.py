@@ -0,0 +1,65 @@
+"""
+HashProof Test Storage
+In-memory test storage that falls back to the last snapshot for tests not yet touched since restart
+"""
+
+from typing import Dict, Iterable, Optional, Set, Tuple
+from question_models import StoredTest
+from snapshot import Snapshot, SnapshotError, Record
+
+class TestStore:
+    """Dict-like test_id -> StoredTest map; snapshot entries are decoded on first access"""
+
+    def __init__(self):
+        self._tests: Dict[str, StoredTest] = {}
+        self._snapshot: Optional[Snapshot] = None
+        self._namespace = ""
+        self._lazy: Set[str] = set()
+
+    def get(self, test_id: str) -> Optional[StoredTest]:
+        test = self._tests.get(test_id)
+        if test is None and test_id in self._lazy:
+            test = self._load(test_id)
+        return test
+
+    def _load(self, test_id: str) -> Optional[StoredTest]:
+        self._lazy.discard(test_id)
+        try:
+            raw = self._snapshot.read(self._namespace, test_id)
+        except SnapshotError as e:
+            print(f"⚠️  Dropping snapshot entry: {e}")
+            return None
+        test = StoredTest.from_json(raw)
+        self._tests[test_id] = test
+        return test
+
+    def __setitem__(self, test_id: str, test: StoredTest):
+        self._tests[test_id] = test
+        self._lazy.discard(test_id)
+
+    def put_many(self, tests: Iterable[StoredTest]):
+        """Store a batch of tests in one update"""
+        batch = {test.test_id: test for test in tests}
+        self._tests.update(batch)
+        self._lazy.difference_update(batch)
+
+    def __contains__(self, test_id: str) -> bool:
+        return test_id in self._tests or test_id in self._lazy
+
+    def __len__(self) -> int:
+        return len(self._tests) + len(self._lazy)
+
+    def load_snapshot(self, snapshot: Snapshot, namespace: str):
+        self._snapshot = snapshot
+        self._namespace = namespace
+        self._lazy = {key for key in snapshot.keys(namespace) if key not in self._tests}
+
+    def dump_snapshot(self) -> Iterable[Tuple[str, Record]]:
+        for test_id, test in self._tests.items():
+            yield test_id, test.payload
+        for test_id in self._lazy:
+            # Never decoded since restart: copy the compressed record straight across
+            yield test_id, self._snapshot.record(self._namespace, test_id)
+
+# One store per process, shared by every router mounted in it
+TEST_STORAGE = TestStore()
@@ -0,0 +1,192 @@
+"""
+HashProof Structured Output
+JSON-mode request formats, a tolerant parser that salvages complete question objects from damaged
+responses, and a bounded repair loop that asks only for the questions still missing
+"""
+
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import orjson
+from metrics import METRICS
+from question_models import SchemaError
+
+# CONFIGURATION
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "json_schema").lower()  # json_schema, json_object or off
+GENERATION_REPAIR_ATTEMPTS = int(os.getenv("GENERATION_REPAIR_ATTEMPTS", "1"))
+
+_THINK_BLOCK = re.compile(r"<think>.*?(</think>|$)", re.DOTALL)
+
+MCQ_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {
+            "type": "object",
+            "properties": {letter: {"type": "string"} for letter in "ABCD"},
+            "required": list("ABCD"),
+        },
+        "correct": {"type": "string", "enum": list("ABCD")},
+        "points": {"type": "integer"},
+        "explanation": {"type": "string"},
+    },
+    "required": ["question", "options", "correct"],
+}
+
+CODE_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "template": {"type": "string"},
+        "solution": {"type": "string"},
+        "points": {"type": "integer"},
+        "test_cases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"input": {"type": "string"}, "expected": {"type": "string"}},
+                "required": ["input", "expected"],
+            },
+        },
+    },
+    "required": ["question", "solution", "test_cases"],
+}
+
+def response_format(name: str, item_schema: Dict) -> Optional[Dict]:
+    """`response_format` for a `{"questions": [...]}` reply in the configured mode, or None when off"""
+    if STRUCTURED_OUTPUT == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": name,
+                "schema": {
+                    "type": "object",
+                    "properties": {"questions": {"type": "array", "items": item_schema}},
+                    "required": ["questions"],
+                },
+            },
+        }
+    if STRUCTURED_OUTPUT == "json_object":
+        return {"type": "json_object"}
+    return None
+
+MCQ_RESPONSE_FORMAT = response_format("mcq_questions", MCQ_ITEM_SCHEMA)
+CODE_RESPONSE_FORMAT = response_format("code_questions", CODE_ITEM_SCHEMA)
+
+def _items_of(parsed: Any) -> Optional[List[Any]]:
+    if isinstance(parsed, list):
+        return parsed
+    if isinstance(parsed, dict):
+        if "question" in parsed:
+            return [parsed]
+        for value in parsed.values():  # {"questions": [...]} or any single-array wrapper
+            if isinstance(value, list):
+                return value
+    return None
+
+def salvage_items(response: str, item_key: str = "question") -> Tuple[List[Dict], bool]:
+    """Question objects in an AI response; returns (items, whole_response_parsed).
+
+    Reasoning blocks and code fences are ignored. When the response is not valid JSON as a whole
+    (truncated, prose around it, a broken item) a single scan collects every complete, parseable
+    object that has `item_key`, so one bad or cut-off question does not discard the rest.
+    """
+    text = _THINK_BLOCK.sub("", response).strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    text = text.strip()
+
+    try:
+        items = _items_of(orjson.loads(text))
+        if items is not None:
+            return [item for item in items if isinstance(item, dict)], True
+    except orjson.JSONDecodeError:
+        pass
+
+    items: List[Dict] = []
+    starts: List[int] = []
+    claimed_until = -1  # end of the last collected item; objects enclosing it are not candidates
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            starts.append(i)
+        elif ch == "}" and starts:
+            start = starts.pop()
+            if start <= claimed_until:
+                continue
+            try:
+                obj = orjson.loads(text[start:i + 1])
+            except orjson.JSONDecodeError:
+                continue
+            if isinstance(obj, dict) and item_key in obj:
+                items.append(obj)
+                claimed_until = i
+    if items:
+        METRICS.incr("structured_output_salvaged")
+    return items, False
+
+async def generate_validated(request: Callable[[int, List[str]], Awaitable[str]],
+                             build: Callable[[Dict, int], Any], count: int,
+                             key: Callable[[Any], str], label: str,
+                             verify: Optional[Callable[[List[Any]], Awaitable[List[Any]]]] = None,
+                             renumber: Optional[Callable[[Any, int], Any]] = None) -> List[Any]:
+    """Up to `count` validated, distinct items from one request plus at most GENERATION_REPAIR_ATTEMPTS
+    follow-ups, each asking only for the missing items.
+
+    `request(n, existing)` asks the AI for n items not among `existing` (by `key`); `build(raw, index)`
+    validates one raw object, raising SchemaError to drop it; `index` is the item's position in the
+    result. `verify(items)`, if given, returns the subset of each response's items worth keeping; the
+    ones it drops are asked for again and listed in `existing` so they are not repeated, and
+    `renumber(item, index)` gives the kept ones their final position so IDs stay contiguous. An AI
+    error ends the loop.
+    """
+    items: List[Any] = []
+    seen = set()
+    for attempt in range(1 + GENERATION_REPAIR_ATTEMPTS):
+        missing = count - len(items)
+        response = await request(missing, list(seen))
+        print(f"🔍 Raw AI Response: {response[:300]}...")
+        if response.startswith("AI Error:"):
+            print(f"❌ AI Error detected, stopping {label} generation")
+            break
+
+        raws, whole = salvage_items(response)
+        if not whole:
+            print(f"🩹 Salvaged {len(raws)} {label} question object(s) from an unparseable response")
+        fresh = []
+        for raw in raws:
+            if len(items) + len(fresh) >= count:
+                break
+            try:
+                item = build(raw, len(items) + len(fresh))
+            except SchemaError as e:
+                print(f"⚠️  {label} question invalid ({e}), skipping")
+                continue
+            if key(item) in seen:
+                continue
+            seen.add(key(item))
+            fresh.append(item)
+        if verify:
+            kept = await verify(fresh)
+            if renumber and len(kept) < len(fresh):
+                kept = [renumber(item, len(items) + i) for i, item in enumerate(kept)]
+            fresh = kept
+        items.extend(fresh)
+
+        if len(items) >= count:
+            break
+        if attempt < GENERATION_REPAIR_ATTEMPTS:
+            METRICS.incr("generation_repairs")
+            METRICS.incr("generation_repair_items", count - len(items))
+            print(f"🔧 {len(items)}/{count} valid {label} questions, requesting the {count - len(items)} missing")
+    return items
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Service modules import each other by bare name (`from metrics import METRICS`), as when run from ml-service/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
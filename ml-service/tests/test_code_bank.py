@@ -0,0 +1,32 @@
+from code_bank import CodeBank
+from question_models import CodeQuestion
+
+def _question(i: int) -> CodeQuestion:
+    return CodeQuestion(f"python_code_{i}", f"Write f{i}", "", f"def f{i}(): return {i}", 5,
+                        [{"input": f"f{i}()", "expected": str(i)}], verified=True)
+
+def test_sample_draws_distinct_questions_of_one_bucket():
+    bank = CodeBank()
+    bank.add("Python", "beginner", [_question(i) for i in range(5)])
+    bank.add("Python", "advanced", [_question(9)])
+    picked = bank.sample("python", "beginner", 10)
+    assert sorted(q.question for q in picked) == [f"Write f{i}" for i in range(5)]
+    assert bank.sample("Python", "intermediate", 3) == []
+
+def test_same_question_is_banked_once():
+    bank = CodeBank()
+    bank.add("Python", "beginner", [_question(1)])
+    bank.add("Python", "beginner", [_question(1).copy(id="python_code_7")])
+    assert len(bank) == 1
+
+def test_bank_is_bounded():
+    bank = CodeBank(max_entries=3)
+    bank.add("Python", "beginner", [_question(i) for i in range(5)])
+    assert len(bank) == 3
+    assert {q.question for q in bank.sample("Python", "beginner", 5)} == {"Write f2", "Write f3", "Write f4"}
+
+def test_round_trips_through_its_codec():
+    bank = CodeBank()
+    question = _question(1)
+    restored = bank.decode(bank.encode(question))
+    assert restored.to_dict() == question.to_dict()
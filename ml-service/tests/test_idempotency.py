@@ -0,0 +1,73 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from idempotency import IdempotencyStore
+from snapshot import Snapshot, write_snapshot
+
+class Grader:
+    def __init__(self, result=None):
+        self.runs = 0
+        self.result = result or {"overall_score": 0.8}
+
+    async def __call__(self):
+        self.runs += 1
+        await asyncio.sleep(0.01)
+        return dict(self.result)
+
+def test_concurrent_duplicates_share_one_grading():
+    store, grade = IdempotencyStore(), Grader()
+
+    async def run():
+        return await asyncio.gather(*(store.run("k", "f", grade) for _ in range(3)))
+
+    assert asyncio.run(run()) == [{"overall_score": 0.8}] * 3
+    assert grade.runs == 1
+
+def test_grading_finishes_when_every_caller_leaves():
+    store, grade = IdempotencyStore(), Grader()
+
+    async def run():
+        caller = asyncio.ensure_future(store.run("k", "f", grade))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.sleep(0.05)
+        return await store.run("k", "f", grade)
+
+    assert asyncio.run(run()) == {"overall_score": 0.8}
+    assert grade.runs == 1
+
+def test_reused_key_with_other_answers_conflicts():
+    store = IdempotencyStore()
+    asyncio.run(store.run("k", "f", Grader()))
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(store.run("k", "other", Grader()))
+    assert e.value.status_code == 409
+
+def test_results_with_ungraded_answers_are_not_kept():
+    store, grade = IdempotencyStore(), Grader({"ungraded_answers": 1})
+    asyncio.run(store.run("k", "f", grade))
+    asyncio.run(store.run("k", "f", grade))
+    assert grade.runs == 2
+
+def test_completed_results_survive_a_snapshot_round_trip(tmp_path):
+    store, grade = IdempotencyStore(), Grader()
+    asyncio.run(store.run("k", "f", grade))
+    path = str(tmp_path / "state.snap")
+    write_snapshot(path, (("gradings", key, record) for key, record in store.dump_snapshot()))
+
+    restored = IdempotencyStore()
+    restored.load_snapshot(Snapshot(path), "gradings")
+    assert len(restored) == 1 and not restored.completed
+    assert asyncio.run(restored.run("k", "f", grade)) == {"overall_score": 0.8}
+    assert grade.runs == 1
+
+def test_expired_results_are_not_restored(tmp_path):
+    store = IdempotencyStore(retention=0.01)
+    asyncio.run(store.run("k", "f", Grader()))
+    time.sleep(0.02)
+    path = str(tmp_path / "state.snap")
+    write_snapshot(path, (("gradings", key, record) for key, record in store.dump_snapshot()))
+    restored = IdempotencyStore()
+    restored.load_snapshot(Snapshot(path), "gradings")
+    assert len(restored) == 0
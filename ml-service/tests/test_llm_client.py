@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+from llm_client import DeepSeekClient
+
+class BadRequest(Exception):
+    status_code = 400
+
+class FakeCompletions:
+    def __init__(self, error: Exception):
+        self.error = error
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append("response_format" in kwargs)
+        if "response_format" in kwargs and self.error:
+            raise self.error
+        return "completion"
+
+def _client(error: Exception):
+    completions = FakeCompletions(error)
+    client = DeepSeekClient()
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return client, completions
+
+def _create(client: DeepSeekClient):
+    return asyncio.run(client._create("prompt", 10, 0.3, {"type": "json_object"}, timeout=5))
+
+def test_rejection_naming_response_format_disables_it():
+    client, completions = _client(BadRequest("Error code: 400 - unsupported parameter 'response_format'"))
+    assert _create(client) == "completion"
+    assert not client.response_format_supported
+    _create(client)
+    assert completions.calls == [True, False, False]
+
+def test_unrelated_bad_request_retries_only_that_call():
+    client, completions = _client(BadRequest("Error code: 400 - prompt is too long"))
+    assert _create(client) == "completion"
+    assert client.response_format_supported
+    completions.error = None
+    _create(client)
+    assert completions.calls == [True, False, True]
@@ -0,0 +1,38 @@
+import orjson
+import question_bank
+from question_bank import QuestionBank
+
+SOURCE = {
+    "mcq": {"Python": {"beginner": [
+        {"question": f"Q{i}?", "options": {"A": "a", "B": "b", "C": "c", "D": "d"}, "correct": "A"} for i in range(3)
+    ]}},
+}
+
+def _source(tmp_path) -> str:
+    path = tmp_path / "bank.json"
+    path.write_bytes(orjson.dumps(SOURCE))
+    return str(path)
+
+def test_bank_is_built_on_first_open_and_sampled(tmp_path):
+    bank = QuestionBank(str(tmp_path / "out" / "bank.bank"), _source(tmp_path))
+    assert bank.count("mcq", "Python", "beginner") == 3
+    assert sorted(q["question"] for q in bank.sample("mcq", "python", "advanced", 3)) == ["Q0?", "Q1?", "Q2?"]
+    assert bank.sample("code", "Python", "beginner", 1) == []
+    bank.close()
+
+def test_unwritable_bank_path_falls_back_to_temp_dir(tmp_path, monkeypatch):
+    blocker = tmp_path / "readonly"
+    blocker.write_bytes(b"")  # a file where the bank's directory should be: creating it fails
+    temp_dir = tmp_path / "tmp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(question_bank.tempfile, "gettempdir", lambda: str(temp_dir))
+
+    bank = QuestionBank(str(blocker / "bank.bank"), _source(tmp_path))
+    assert bank.count("mcq", "Python", "beginner") == 3
+    assert bank.path.startswith(str(temp_dir))
+    bank.close()
+
+    again = QuestionBank(str(blocker / "bank.bank"), _source(tmp_path))
+    again.open()
+    assert again.path == bank.path  # reused, not rebuilt
+    again.close()
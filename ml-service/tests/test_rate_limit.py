@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+import rate_limit
+from rate_limit import RateLimitTimeout, TokenBucket, UpstreamLimiter, backoff_delay
+
+class FakeClock:
+    """Stands in for time.monotonic and asyncio.sleep: sleeping advances the clock instantly"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        await asyncio.sleep(0)  # still let other tasks run, as a real sleep would
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def _limiter(clock: FakeClock, rpm: float = 0, tpm: float = 0) -> UpstreamLimiter:
+    return UpstreamLimiter(rpm=rpm, tpm=tpm, clock=clock, sleep=clock.sleep)
+
+def test_bucket_starts_full_and_refills_at_rate(clock):
+    bucket = TokenBucket(60, clock)  # one per second
+    assert bucket.delay_for(60) == 0.0
+    bucket.take(60)
+    assert bucket.delay_for(1) == pytest.approx(1.0)
+    assert bucket.delay_for(3) == pytest.approx(3.0)
+    clock.now += 2.5
+    assert bucket.delay_for(2) == 0.0
+    assert bucket.delay_for(3) == pytest.approx(0.5)
+
+def test_bucket_holds_at_most_one_minute(clock):
+    bucket = TokenBucket(60, clock)
+    clock.now += 600
+    assert bucket.delay_for(60) == 0.0
+    bucket.take(60)
+    assert bucket.delay_for(1) == pytest.approx(1.0)
+
+def test_oversized_amount_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(60, clock)
+    bucket.take(30)
+    assert bucket.delay_for(1000) == pytest.approx(30.0)
+    bucket.take(1000)
+    assert bucket.level == pytest.approx(-30.0)
+
+def test_refund_is_capped(clock):
+    bucket = TokenBucket(60, clock)
+    bucket.take(10)
+    bucket.refund(50)
+    assert bucket.level == 60
+
+def test_acquire_waits_for_the_next_request_slot(clock):
+    limiter = _limiter(clock, rpm=600)  # one request per 0.1s
+    limiter.requests.level = 0
+    waited = asyncio.run(limiter.acquire(100, timeout=5))
+    assert clock.sleeps == [pytest.approx(0.1)]
+    assert waited == pytest.approx(0.1)
+    assert limiter.waits == 1 and limiter.max_wait_seconds == pytest.approx(0.1)
+
+def test_queued_calls_are_spaced_by_the_request_rate(clock):
+    limiter = _limiter(clock, rpm=60)
+    limiter.requests.level = 0
+
+    async def run():
+        return await asyncio.gather(*(limiter.acquire(10, timeout=10) for _ in range(3)))
+
+    assert asyncio.run(run()) == [pytest.approx(1.0), pytest.approx(2.0), pytest.approx(3.0)]
+
+def test_acquire_gives_up_at_once_when_the_deadline_is_too_close(clock):
+    limiter = _limiter(clock, rpm=60)
+    limiter.requests.level = 0
+    with pytest.raises(RateLimitTimeout):
+        asyncio.run(limiter.acquire(100, timeout=0.5))
+    assert clock.sleeps == []
+
+def test_token_quota_reservation_and_settle(clock):
+    limiter = _limiter(clock, tpm=1000)
+    assert limiter.try_acquire(800)
+    assert not limiter.try_acquire(800)
+    limiter.settle(800, 100)  # the call used far less than it reserved
+    assert limiter.try_acquire(800)
+
+def test_try_acquire_respects_pause(clock):
+    limiter = _limiter(clock, rpm=60)
+    limiter.pause(5)
+    assert not limiter.try_acquire(10)
+    clock.now += 5
+    assert limiter.try_acquire(10)
+
+def test_zero_quota_is_not_enforced():
+    limiter = UpstreamLimiter(rpm=0, tpm=0)
+    assert limiter.requests is None and limiter.tokens is None
+    assert all(limiter.try_acquire(10 ** 9) for _ in range(100))
+
+def test_backoff_honours_retry_after():
+    class Response:
+        headers = {"retry-after": "7"}
+
+    class RateLimited(Exception):
+        status_code = 429
+        response = Response()
+
+    assert rate_limit.is_retryable(RateLimited())
+    assert all(7 <= backoff_delay(attempt, RateLimited()) <= rate_limit.BACKOFF_CAP_SECONDS for attempt in range(8))
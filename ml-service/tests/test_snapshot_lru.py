@@ -0,0 +1,45 @@
+import orjson
+from snapshot import Snapshot, write_snapshot
+from snapshot_lru import SnapshotLRU
+
+def _lru(max_entries: int = 3) -> SnapshotLRU:
+    return SnapshotLRU(max_entries, encode=orjson.dumps, decode=orjson.loads, metric="test_cache")
+
+def _save(lru: SnapshotLRU, path: str) -> Snapshot:
+    write_snapshot(path, (("cache", key, record) for key, record in lru.dump_snapshot()))
+    return Snapshot(path)
+
+def test_least_recently_used_entry_is_evicted():
+    lru = _lru()
+    for key in "abc":
+        lru.put(key, {"v": key})
+    lru.get("a")
+    lru.put("d", {"v": "d"})
+    assert list(lru.keys()) == ["c", "a", "d"]
+    assert lru.get("b") is None
+
+def test_restored_entries_are_decoded_on_first_lookup(tmp_path):
+    lru = _lru()
+    lru.put("a", {"v": 1})
+    lru.put("b", {"v": 2})
+    snapshot = _save(lru, str(tmp_path / "one.snap"))
+
+    restored = _lru()
+    restored.load_snapshot(snapshot, "cache")
+    assert len(restored) == 2 and not restored.entries
+    assert restored.get("b") == {"v": 2}
+    assert list(restored.entries) == ["b"]
+
+def test_resave_keeps_undecoded_entries_and_trims_them_first(tmp_path):
+    lru = _lru()
+    for key in "abc":
+        lru.put(key, {"v": key})
+    restored = _lru()
+    restored.load_snapshot(_save(lru, str(tmp_path / "one.snap")), "cache")
+    restored.get("a")
+    restored.put("d", {"v": "d"})
+
+    again = _lru()
+    again.load_snapshot(_save(restored, str(tmp_path / "two.snap")), "cache")
+    assert sorted(again.keys()) == ["a", "c", "d"]  # "b" was the oldest untouched entry
+    assert again.get("c") == {"v": "c"}
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Dict, List
+from question_models import SchemaError
+from structured_output import generate_validated, salvage_items
+
+def test_whole_response_is_parsed():
+    items, whole = salvage_items('{"questions": [{"question": "a"}, {"question": "b"}]}')
+    assert whole and [i["question"] for i in items] == ["a", "b"]
+
+def test_fenced_response_with_reasoning_block():
+    response = '<think>plan {"question": "nope"}</think>\n```json\n[{"question": "a"}]\n```'
+    items, whole = salvage_items(response)
+    assert whole and items == [{"question": "a"}]
+
+def test_truncated_response_keeps_complete_items():
+    response = '{"questions": [{"question": "a", "options": {"A": "x"}}, {"question": "b"}, {"question": "c", "opt'
+    items, whole = salvage_items(response)
+    assert not whole
+    assert [i["question"] for i in items] == ["a", "b"]
+    assert items[0]["options"] == {"A": "x"}  # nested objects stay inside their item
+
+def test_broken_item_and_braces_in_strings_do_not_discard_the_rest():
+    response = 'Here you go: [{"question": "uses } and { in text"}, {"question": bad}, {"question": "c"}] thanks'
+    items, whole = salvage_items(response)
+    assert not whole
+    assert [i["question"] for i in items] == ["uses } and { in text", "c"]
+
+def test_unfinished_fence_is_salvaged():
+    items, whole = salvage_items('```json\n[{"question": "a"}, {"question"')
+    assert not whole and items == [{"question": "a"}]
+
+def _run(responses: List[str], count: int, verify=None, renumber=None):
+    asked = []
+
+    async def request(n: int, existing: List[str]) -> str:
+        asked.append(n)
+        return responses.pop(0)
+
+    def build(raw: Dict, index: int) -> Dict:
+        if "question" not in raw:
+            raise SchemaError("no question")
+        return {"id": f"q_{index+1}", "question": raw["question"]}
+
+    items = asyncio.run(generate_validated(request, build, count, key=lambda q: q["question"], label="test",
+                                           verify=verify, renumber=renumber))
+    return items, asked
+
+def test_repair_asks_only_for_missing_items():
+    items, asked = _run(['[{"question": "a"}, {"nope": 1}]', '[{"question": "a"}, {"question": "b"}]'], 2)
+    assert asked == [2, 1]
+    assert [q["id"] for q in items] == ["q_1", "q_2"]
+
+def test_ids_stay_contiguous_when_verification_drops_items():
+    async def verify(items: List[Dict]) -> List[Dict]:
+        return [q for q in items if not q["question"].startswith("bad")]
+
+    items, asked = _run(['[{"question": "a"}, {"question": "bad1"}, {"question": "b"}]', '[{"question": "c"}]'], 3,
+                        verify=verify, renumber=lambda q, index: dict(q, id=f"q_{index+1}"))
+    assert asked == [3, 1]
+    assert [(q["id"], q["question"]) for q in items] == [("q_1", "a"), ("q_2", "b"), ("q_3", "c")]
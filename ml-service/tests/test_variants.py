@@ -0,0 +1,57 @@
+from question_models import CodeQuestion, MCQQuestion, StoredTest
+from variants import OPTION_LETTERS, Variant, VariantStore
+
+def _question(i: int, correct: str = "B") -> MCQQuestion:
+    options = {letter: f"q{i} option {letter}" for letter in OPTION_LETTERS}
+    return MCQQuestion(f"q{i}", f"Question {i}?", options, correct, 10, "")
+
+def _base(n: int = 12) -> StoredTest:
+    return StoredTest("base", "mcq", "Python", "beginner", [_question(i, OPTION_LETTERS[i % 4]) for i in range(n)])
+
+def test_derive_is_deterministic_per_student():
+    base = _base()
+    assert Variant.derive(base, "alice").vector == Variant.derive(base, "alice").vector
+    assert Variant.derive(base, "alice").test_id != Variant.derive(base, "bob").test_id
+
+def test_shown_and_original_letters_are_inverse():
+    base = _base()
+    variant = Variant.derive(base, "alice")
+    for i in range(base.question_count):
+        for letter in OPTION_LETTERS:
+            assert variant.original_letter(i, variant.shown_letter(i, letter)) == letter
+            assert variant.shown_letter(i, variant.original_letter(i, letter)) == letter
+
+def test_render_keeps_option_text_under_remapped_letters():
+    base = _base()
+    variant = Variant.derive(base, "alice")
+    rendered = variant.render(base)
+    assert rendered.test_id == variant.test_id
+    assert sorted(q.id for q in rendered.questions) == sorted(q.id for q in base.questions)
+    by_id = {q.id: (i, q) for i, q in enumerate(base.questions)}
+    for shown in rendered.questions:
+        base_index, original = by_id[shown.id]
+        assert shown.options[shown.correct] == original.options[original.correct]
+        for letter, text in shown.options.items():
+            assert original.options[variant.original_letter(base_index, letter)] == text
+
+def test_answer_outside_option_letters_passes_through():
+    variant = Variant.derive(_base(), "alice")
+    assert variant.original_letter(0, "E") == "E"
+    assert variant.shown_letter(0, "") == ""
+
+def test_questions_without_four_options_are_not_permuted():
+    odd = MCQQuestion("q0", "True or false?", {"A": "True", "B": "False"}, "B", 10, "")
+    code = CodeQuestion("c0", "Write it", "", "def f(): pass", 10, [])
+    base = StoredTest("base", "mcq", "Python", "beginner", [odd, code])
+    variant = Variant.derive(base, "alice")
+    rendered = {q.id: q for q in variant.render(base).questions}
+    assert rendered["q0"].options == odd.options and rendered["q0"].correct == "B"
+    assert variant.original_letter(0, "A") == "A"
+
+def test_store_issues_the_same_variant_again():
+    store = VariantStore()
+    base = _base()
+    first = store.issue(base, "alice")
+    assert store.issue(base, "alice") is first
+    assert store.get(first.test_id) is first
+    assert len(store) == 1
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import hmac
+import os
+from typing import List
+import httpx
+import orjson
+from question_models import StoredTest
+import webhooks
+from webhooks import WebhookOutbox
+
+TEST = StoredTest("t1", "mcq", "Python", "beginner", [])
+
+def _result(i: int):
+    return {"result_id": f"r{i}", "student_id": f"s{i}", "test_id": "t1", "overall_score": 0.5}
+
+class Receiver:
+    """httpx transport that records each batch and answers with the queued status codes, then 200"""
+
+    def __init__(self, *statuses: int):
+        self.statuses = list(statuses)
+        self.requests: List[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return httpx.Response(self.statuses.pop(0) if self.statuses else 200, json={})
+
+    @property
+    def batches(self) -> List[List[str]]:
+        return [[r["result_id"] for r in orjson.loads(req.content)["results"]] for req in self.requests]
+
+def _start(directory: str, receiver: Receiver, **options) -> WebhookOutbox:
+    outbox = WebhookOutbox(url="http://receiver/webhooks/results", **options)
+    outbox.start(directory)
+    outbox._client = httpx.AsyncClient(transport=httpx.MockTransport(receiver))
+    return outbox
+
+async def _settled(outbox: WebhookOutbox, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while outbox.pending and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+
+def test_each_live_outbox_gets_its_own_slot(tmp_path):
+    async def run():
+        first, second = _start(str(tmp_path), Receiver()), _start(str(tmp_path), Receiver())
+        paths = first.events_path, second.events_path
+        await first.stop()
+        third = _start(str(tmp_path), Receiver())
+        reused = third.events_path
+        await second.stop()
+        await third.stop()
+        return paths, reused
+
+    (first, second), reused = asyncio.run(run())
+    assert os.path.basename(first) == "outbox-0.jsonl"
+    assert os.path.basename(second) == "outbox-1.jsonl"
+    assert reused == first
+
+def test_burst_is_sent_as_batches(tmp_path):
+    receiver = Receiver()
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, batch_size=3, batch_wait=0.05, max_in_flight=1)
+        await asyncio.gather(*(outbox.enqueue(TEST, _result(i)) for i in range(7)))
+        await _settled(outbox)
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert receiver.batches == [["r0", "r1", "r2"], ["r3", "r4", "r5"], ["r6"]]
+    assert outbox.delivered == 7 and not outbox.pending
+    assert os.path.getsize(tmp_path / "outbox-0.jsonl") == 0  # compacted once nothing is pending
+
+def test_batches_are_signed(tmp_path):
+    receiver = Receiver()
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, secret="s3cret", batch_wait=0)
+        await outbox.enqueue(TEST, _result(1))
+        await _settled(outbox)
+        await outbox.stop()
+
+    asyncio.run(run())
+    request = receiver.requests[0]
+    expected = hmac.new(b"s3cret", request.content, hashlib.sha256).hexdigest()
+    assert request.headers["X-HashProof-Signature"] == f"sha256={expected}"
+    event = orjson.loads(request.content)["results"][0]
+    assert event["event"] == "grading.completed" and event["topic"] == "Python"
+
+def test_retryable_failure_is_sent_again(tmp_path, monkeypatch):
+    monkeypatch.setattr("webhooks.backoff_delay", lambda attempt, error: 0.01)
+    receiver = Receiver(503)
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, batch_wait=0)
+        await outbox.enqueue(TEST, _result(1))
+        await _settled(outbox)
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert receiver.batches == [["r1"], ["r1"]]
+    assert outbox.retries == 1 and outbox.delivered == 1
+
+def test_rejected_batch_goes_to_dead_letter(tmp_path):
+    receiver = Receiver(400)
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, batch_wait=0)
+        await outbox.enqueue(TEST, _result(1))
+        await _settled(outbox)
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert outbox.rejected == 1 and not outbox.pending
+    with open(tmp_path / "outbox-0.rejected.jsonl", "rb") as f:
+        assert orjson.loads(f.readline())["result_id"] == "r1"
+
+def test_restart_resends_only_unacknowledged_results(tmp_path):
+    (tmp_path / "outbox-0.jsonl").write_bytes(
+        b"".join(orjson.dumps(dict(_result(i), event="grading.completed")) + b"\n" for i in range(3)) + b'{"result_id": "torn'
+    )
+    (tmp_path / "outbox-0.acked").write_bytes(b"r1\n")
+    receiver = Receiver()
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, batch_wait=0)
+        await _settled(outbox)
+        await outbox.stop()
+
+    asyncio.run(run())
+    assert receiver.batches == [["r0", "r2"]]
+
+def test_concurrent_enqueues_share_an_fsync(tmp_path, monkeypatch):
+    rounds = []
+    apply_writes = webhooks._apply_writes
+    monkeypatch.setattr(webhooks, "_apply_writes", lambda writes: (rounds.append(len(writes)), apply_writes(writes)))
+    monkeypatch.setattr("webhooks.backoff_delay", lambda attempt, error: 60)
+    receiver = Receiver(*[503] * 20)  # nothing is delivered, so nothing is acknowledged
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, batch_wait=0)
+        await asyncio.gather(*(outbox.enqueue(TEST, _result(i)) for i in range(20)))
+        with open(tmp_path / "outbox-0.jsonl", "rb") as f:
+            written = [orjson.loads(line)["result_id"] for line in f]
+        await outbox.stop()
+        return written
+
+    assert asyncio.run(run()) == [f"r{i}" for i in range(20)]  # on disk, in order, once enqueue returns
+    assert rounds == [3, 20]  # the startup compaction, then the whole burst in one round
+
+def test_accepted_grading_is_resumed_after_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr("webhooks.WEBHOOK_DRAIN_SECONDS", 0)
+    receiver = Receiver()
+
+    def prepare(request):
+        return lambda: restarted.enqueue(TEST, dict(_result(1), student_id=request["student_id"]))
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, batch_wait=0)
+        await outbox.run_detached("mcq", {"student_id": "s1", "test_id": "t1"}, "k1", lambda: asyncio.sleep(60))
+        await outbox.stop()  # the grading is still running: cancelled, but its request is on disk
+
+        restarted.resume_with("mcq", prepare)
+        restarted.start(str(tmp_path))
+        restarted._client = httpx.AsyncClient(transport=httpx.MockTransport(receiver))
+        while restarted.jobs or restarted.pending:
+            await asyncio.sleep(0.01)
+        await restarted.stop()
+
+    restarted = WebhookOutbox(url="http://receiver/webhooks/results", batch_wait=0)
+    asyncio.run(run())
+    assert receiver.batches == [["r1"]]
+    assert os.path.getsize(tmp_path / "outbox-0.accepted") == 0  # finished and compacted
+
+def test_accepted_grading_without_a_resume_hook_is_delivered_as_failed(tmp_path):
+    (tmp_path / "outbox-0.accepted").write_bytes(orjson.dumps(
+        {"job_id": "j1", "kind": "code", "idempotency_key": "k1", "request": {"student_id": "s1", "test_id": "t1"}}
+    ) + b"\n")
+    receiver = Receiver()
+
+    async def run():
+        outbox = _start(str(tmp_path), receiver, batch_wait=0)
+        while outbox.jobs or outbox.pending:
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(run())
+    event = orjson.loads(receiver.requests[0].content)["results"][0]
+    assert event["event"] == "grading.failed" and event["idempotency_key"] == "k1" and event["student_id"] == "s1"
@@ -0,0 +1,109 @@
+"""
+HashProof Token Usage
+Per-call token accounting and adaptive max_tokens budgets
+"""
+
+import math
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from config import PROMPT_PRICE_PER_MTOK, COMPLETION_PRICE_PER_MTOK
+from metrics import METRICS
+import prompts
+from prompts import cached_prompt_tokens
+from rate_limit import UPSTREAM_LIMITER
+
+# CONFIGURATION
+BUDGET_PERCENTILE = 0.9
+BUDGET_MARGIN = 1.2  # headroom above the observed percentile
+MIN_SAMPLES = 10  # below this the prior is used
+SAMPLE_WINDOW = 200
+TRUNCATED_SAMPLE_FACTOR = 1.5  # a truncated call needed more than it got; record it inflated
+
+class BudgetProfile:
+    """Token budget rules for one kind of call"""
+
+    __slots__ = ("prior_per_question", "overhead", "floor", "ceiling")
+
+    def __init__(self, prior_per_question: int, overhead: int, floor: int, ceiling: int):
+        self.prior_per_question = prior_per_question
+        self.overhead = overhead
+        self.floor = floor
+        self.ceiling = ceiling
+
+# Priors match the old hardcoded limits at the old default question counts
+PROFILES = {
+    "mcq_generation": BudgetProfile(prior_per_question=380, overhead=100, floor=500, ceiling=8000),
+    "code_generation": BudgetProfile(prior_per_question=800, overhead=100, floor=800, ceiling=8000),
+    "code_grading": BudgetProfile(prior_per_question=400, overhead=0, floor=200, ceiling=1500),
+}
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+class UsageTracker:
+    def __init__(self):
+        self.aggregates: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+        self.per_question: Dict[str, Deque[float]] = {}
+
+    def max_tokens_for(self, kind: str, question_count: int = 1) -> int:
+        """max_tokens for a call producing `question_count` items, from observed tokens-per-question"""
+        profile = PROFILES[kind]
+        samples = self.per_question.get(kind)
+        if samples and len(samples) >= MIN_SAMPLES:
+            per_question = _percentile(samples, BUDGET_PERCENTILE) * BUDGET_MARGIN
+        else:
+            per_question = profile.prior_per_question
+        budget = int(profile.overhead + per_question * max(1, question_count))
+        return max(profile.floor, min(profile.ceiling, budget))
+
+    def record(self, kind: str, usage, finish_reason: Optional[str], max_tokens: int,
+               topic: Optional[str] = None, difficulty: Optional[str] = None, question_count: int = 1):
+        """Account one completion; `usage` is the response's usage object (may be None)"""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cached_tokens = cached_prompt_tokens(usage)
+        truncated = finish_reason == "length"
+        cost = (prompt_tokens * PROMPT_PRICE_PER_MTOK + completion_tokens * COMPLETION_PRICE_PER_MTOK) / 1_000_000
+
+        agg = self.aggregates.setdefault((kind, topic or "-", difficulty or "-"), {
+            "calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0, "truncated": 0, "cost": 0.0,
+        })
+        agg["calls"] += 1
+        agg["prompt_tokens"] += prompt_tokens
+        agg["cached_prompt_tokens"] += cached_tokens
+        agg["completion_tokens"] += completion_tokens
+        agg["truncated"] += int(truncated)
+        agg["cost"] += cost
+
+        METRICS.incr("llm_prompt_tokens", prompt_tokens)
+        METRICS.incr("llm_cached_prompt_tokens", cached_tokens)
+        METRICS.incr("llm_completion_tokens", completion_tokens)
+        if truncated:
+            METRICS.incr("llm_truncated_responses")
+            print(f"✂️  {kind} response truncated at max_tokens={max_tokens} ({topic}, {difficulty}, {question_count} questions)")
+
+        if kind in PROFILES and completion_tokens:
+            sample = completion_tokens / max(1, question_count)
+            if truncated:
+                sample *= TRUNCATED_SAMPLE_FACTOR
+            self.per_question.setdefault(kind, deque(maxlen=SAMPLE_WINDOW)).append(sample)
+
+    def report(self) -> Dict:
+        breakdown = []
+        for (kind, topic, difficulty), agg in sorted(self.aggregates.items()):
+            breakdown.append(dict(agg, kind=kind, topic=topic, difficulty=difficulty, cost=round(agg["cost"], 6)))
+        budgets = {}
+        for kind in PROFILES:
+            samples = self.per_question.get(kind) or []
+            budgets[kind] = {
+                "samples": len(samples),
+                "p50_tokens_per_question": round(_percentile(samples, 0.5), 1) if samples else None,
+                "p90_tokens_per_question": round(_percentile(samples, BUDGET_PERCENTILE), 1) if samples else None,
+                "max_tokens_for_1": self.max_tokens_for(kind, 1),
+                "max_tokens_for_5": self.max_tokens_for(kind, 5),
+            }
+        return {"breakdown": breakdown, "budgets": budgets, "prompt_templates": prompts.report(),
+                "rate_limiter": UPSTREAM_LIMITER.status()}
+
+USAGE = UsageTracker()
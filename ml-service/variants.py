@@ -0,0 +1,142 @@
+"""
+HashProof Test Variants
+Per-student MCQ variants of a stored test: a seeded question and option permutation kept as a compact vector
+"""
+
+import hashlib
+import random
+from itertools import permutations
+from typing import Dict, Iterable, Optional, Set, Tuple
+import orjson
+from question_models import MCQQuestion, StoredTest
+from snapshot import Record, Snapshot, SnapshotError
+
+OPTION_LETTERS = ("A", "B", "C", "D")
+# Index into this table is stored per question; 24 orderings of four options fit in one byte
+OPTION_PERMUTATIONS = list(permutations(range(len(OPTION_LETTERS))))
+MAX_VARIANT_QUESTIONS = 256  # question positions are stored as single bytes
+
+def _seed(base_test_id: str, student_id: str) -> bytes:
+    return hashlib.sha256(f"{base_test_id}\0{student_id}".encode()).digest()
+
+def variant_id(base_test_id: str, student_id: str) -> str:
+    return f"{base_test_id}.v{_seed(base_test_id, student_id).hex()[:12]}"
+
+class Variant:
+    """One student's view of a base test.
+
+    `vector` holds n question positions (display order -> base index) followed by n indices into
+    OPTION_PERMUTATIONS, one per base question; the questions themselves are never copied.
+    """
+
+    __slots__ = ("test_id", "base_test_id", "student_id", "vector")
+
+    def __init__(self, test_id: str, base_test_id: str, student_id: str, vector: bytes):
+        self.test_id = test_id
+        self.base_test_id = base_test_id
+        self.student_id = student_id
+        self.vector = vector
+
+    @classmethod
+    def derive(cls, base: StoredTest, student_id: str) -> "Variant":
+        """Deterministic for (base test, student): asking again yields the same variant"""
+        n = base.question_count
+        if n > MAX_VARIANT_QUESTIONS:
+            raise ValueError(f"Variants support at most {MAX_VARIANT_QUESTIONS} questions, test has {n}")
+        rng = random.Random(_seed(base.test_id, student_id))
+        order = list(range(n))
+        rng.shuffle(order)
+        option_perms = [rng.randrange(len(OPTION_PERMUTATIONS)) if _permutable(q) else 0 for q in base.questions]
+        return cls(variant_id(base.test_id, student_id), base.test_id, student_id, bytes(order + option_perms))
+
+    @property
+    def question_count(self) -> int:
+        return len(self.vector) // 2
+
+    def _option_perm(self, base_index: int) -> Tuple[int, ...]:
+        return OPTION_PERMUTATIONS[self.vector[self.question_count + base_index]]
+
+    def original_letter(self, base_index: int, letter: str) -> str:
+        """Base test letter of the option shown to this student as `letter`"""
+        if letter not in OPTION_LETTERS:
+            return letter
+        return OPTION_LETTERS[self._option_perm(base_index)[OPTION_LETTERS.index(letter)]]
+
+    def shown_letter(self, base_index: int, letter: str) -> str:
+        """Letter this student sees for the base test's option `letter`"""
+        if letter not in OPTION_LETTERS:
+            return letter
+        return OPTION_LETTERS[self._option_perm(base_index).index(OPTION_LETTERS.index(letter))]
+
+    def render(self, base: StoredTest) -> StoredTest:
+        """The permuted test as served to the student (built on demand, not stored)"""
+        questions = []
+        for base_index in self.vector[:self.question_count]:
+            q = base.questions[base_index]
+            if _permutable(q):
+                perm = self._option_perm(base_index)
+                q = q.copy(
+                    options={shown: q.options[OPTION_LETTERS[perm[i]]] for i, shown in enumerate(OPTION_LETTERS)},
+                    correct=self.shown_letter(base_index, q.correct)
+                )
+            questions.append(q)
+        extra = dict(base.extra, base_test_id=base.test_id, student_id=self.student_id)
+        return StoredTest(self.test_id, base.type, base.topic, base.difficulty, questions, extra=extra)
+
+    def to_state(self) -> Dict:
+        return {"base_test_id": self.base_test_id, "student_id": self.student_id, "vector": self.vector.hex()}
+
+    @classmethod
+    def from_state(cls, test_id: str, state: Dict) -> "Variant":
+        return cls(test_id, state["base_test_id"], state["student_id"], bytes.fromhex(state["vector"]))
+
+def _permutable(q) -> bool:
+    return isinstance(q, MCQQuestion) and set(q.options) == set(OPTION_LETTERS)
+
+class VariantStore:
+    """Issued variants by variant test_id, about 2 bytes per question each; snapshot entries are decoded on first access"""
+
+    def __init__(self):
+        self.variants: Dict[str, Variant] = {}
+        self._snapshot: Optional[Snapshot] = None
+        self._namespace = ""
+        self._lazy: Set[str] = set()
+
+    def issue(self, base: StoredTest, student_id: str) -> Variant:
+        test_id = variant_id(base.test_id, student_id)
+        variant = self.get(test_id)
+        if variant is None:
+            variant = self.variants[test_id] = Variant.derive(base, student_id)
+        return variant
+
+    def get(self, test_id: str) -> Optional[Variant]:
+        variant = self.variants.get(test_id)
+        if variant is None and test_id in self._lazy:
+            variant = self._load(test_id)
+        return variant
+
+    def _load(self, test_id: str) -> Optional[Variant]:
+        self._lazy.discard(test_id)
+        try:
+            variant = Variant.from_state(test_id, orjson.loads(self._snapshot.read(self._namespace, test_id)))
+        except (SnapshotError, orjson.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"⚠️  Skipping variant record {test_id}: {e}")
+            return None
+        self.variants[test_id] = variant
+        return variant
+
+    def __len__(self) -> int:
+        return len(self.variants) + len(self._lazy)
+
+    def dump_snapshot(self) -> Iterable[Tuple[str, Record]]:
+        for test_id, variant in self.variants.items():
+            yield test_id, orjson.dumps(variant.to_state())
+        for test_id in self._lazy:
+            yield test_id, self._snapshot.record(self._namespace, test_id)
+
+    def load_snapshot(self, snapshot: Snapshot, namespace: str):
+        self._snapshot = snapshot
+        self._namespace = namespace
+        self._lazy = {key for key in snapshot.keys(namespace) if key not in self.variants}
+
+VARIANTS = VariantStore()
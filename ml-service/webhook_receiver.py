@@ -0,0 +1,57 @@
+"""
+HashProof Webhook Stub Receiver
+Stand-in for the backend's callback endpoint when testing result webhooks locally: verifies the
+signature, dedupes by result_id and can fail on purpose to exercise retries
+
+Usage: uvicorn webhook_receiver:app --port 9000
+       RESULT_WEBHOOK_URL=http://localhost:9000/webhooks/results python mcq_service.py
+"""
+
+import hashlib
+import hmac
+import os
+import random
+from collections import OrderedDict
+from typing import Dict, Optional
+import orjson
+from fastapi import FastAPI, Header, HTTPException, Request
+
+# CONFIGURATION
+RESULT_WEBHOOK_SECRET = os.getenv("RESULT_WEBHOOK_SECRET")
+STUB_FAILURE_RATE = float(os.getenv("STUB_FAILURE_RATE", "0"))  # share of batches answered with 503
+STUB_KEEP_RESULTS = 1000
+
+app = FastAPI(title="HashProof Webhook Stub Receiver", version="1.0.0")
+received: "OrderedDict[str, Dict]" = OrderedDict()
+counters = {"batches": 0, "results": 0, "duplicates": 0, "failed_on_purpose": 0}
+
+@app.post("/webhooks/results")
+async def receive_results(request: Request, x_hashproof_signature: Optional[str] = Header(None)):
+    body = await request.body()
+    if RESULT_WEBHOOK_SECRET:
+        expected = "sha256=" + hmac.new(RESULT_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        if not x_hashproof_signature or not hmac.compare_digest(x_hashproof_signature, expected):
+            raise HTTPException(status_code=401, detail="Bad signature")
+    if random.random() < STUB_FAILURE_RATE:
+        counters["failed_on_purpose"] += 1
+        raise HTTPException(status_code=503, detail="Failing on purpose (STUB_FAILURE_RATE)")
+
+    batch = orjson.loads(body)
+    counters["batches"] += 1
+    new = 0
+    for result in batch["results"]:
+        if result["result_id"] in received:
+            counters["duplicates"] += 1
+            continue
+        received[result["result_id"]] = result
+        new += 1
+        if len(received) > STUB_KEEP_RESULTS:
+            received.popitem(last=False)
+    counters["results"] += new
+    print(f"📥 Batch {batch['batch_id']}: {len(batch['results'])} results, {new} new")
+    return {"received": len(batch["results"]), "new": new}
+
+@app.get("/webhooks/results")
+async def list_results(limit: int = 20):
+    """Counters plus the most recent results received"""
+    return {**counters, "latest": list(received.values())[-limit:]}
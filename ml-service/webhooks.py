@@ -0,0 +1,464 @@
+"""
+HashProof Result Webhooks
+Pushes graded results to the backend's callback URL: micro-batched over a pooled HTTP client,
+retried with backoff from a local durable outbox, and identified by result_id for deduplication
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from metrics import METRICS
+from question_models import StoredTest
+from rate_limit import backoff_delay
+from snapshot import claim_slot
+
+if TYPE_CHECKING:
+    import httpx
+
+# CONFIGURATION
+RESULT_WEBHOOK_URL = os.getenv("RESULT_WEBHOOK_URL")  # unset = webhooks disabled
+RESULT_WEBHOOK_SECRET = os.getenv("RESULT_WEBHOOK_SECRET")  # signs each batch (X-HashProof-Signature) when set
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_BATCH_WAIT_SECONDS = float(os.getenv("WEBHOOK_BATCH_WAIT_SECONDS", "0.25"))  # linger to fill a batch
+WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "4"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_DRAIN_SECONDS = 5.0  # shutdown waits this long for in-flight batches and background gradings
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+def _apply_writes(writes: List[Tuple[str, Optional[bytes]]]):
+    """Apply queued outbox writes in order (data None = truncate), with one write and one fsync per file
+    between truncations. Runs in a worker thread."""
+    groups: "OrderedDict[str, List[bytes]]" = OrderedDict()
+    for path, data in writes + [("", None)]:
+        if data is not None:
+            groups.setdefault(path, []).append(data)
+            continue
+        for grouped, chunks in groups.items():
+            _append(grouped, b"".join(chunks))
+        groups.clear()
+        if path and os.path.exists(path):
+            os.truncate(path, 0)
+
+def _append(path: str, data: bytes):
+    """Append and fsync, so a result acknowledged to its caller survives a power loss as well as a crash"""
+    created = not os.path.exists(path)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    if created:  # the new directory entry must reach the disk too
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class _Pending:
+    __slots__ = ("event", "attempts", "next_attempt", "in_flight")
+
+    def __init__(self, event: Dict):
+        self.event = event
+        self.attempts = 0
+        self.next_attempt = 0.0
+        self.in_flight = False
+
+class WebhookOutbox:
+    """Results waiting for delivery, persisted before they are sent and acknowledged once delivered.
+
+    Each worker process owns one outbox slot: `outbox-<n>.jsonl` (events, appended on enqueue),
+    `outbox-<n>.accepted` (202-accepted grade requests, appended before the 202 is sent) and
+    `outbox-<n>.acked` (result_ids delivered or rejected, job_ids of accepted gradings finished), held
+    with an exclusive lock so a restarted worker delivers exactly what its predecessor had not, and
+    grades again the accepted requests it had not finished. The files are truncated whenever nothing
+    is pending or running. File writes go through one writer task that fsyncs off the event loop, so a
+    burst of gradings shares each fsync. A batch is acknowledged as a whole on 2xx; receivers dedupe by result_id,
+    since a batch can be redelivered after a timeout or a crash between send and ack.
+    """
+
+    def __init__(self, url: Optional[str] = RESULT_WEBHOOK_URL, secret: Optional[str] = RESULT_WEBHOOK_SECRET,
+                 batch_size: int = WEBHOOK_BATCH_SIZE, batch_wait: float = WEBHOOK_BATCH_WAIT_SECONDS,
+                 max_in_flight: int = WEBHOOK_MAX_IN_FLIGHT):
+        self.url = url
+        self.secret = secret
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_in_flight = max_in_flight
+        self.pending: "OrderedDict[str, _Pending]" = OrderedDict()
+        self.events_path: Optional[str] = None
+        self.acked_path: Optional[str] = None
+        self.accepted_path: Optional[str] = None
+        self.jobs: Dict[str, Dict] = {}  # accepted gradings running, by job_id
+        self._unfinished: List[Dict] = []  # accepted gradings a previous run left unfinished
+        self._resumers: Dict[str, Callable[[Dict], Callable[[], Awaitable[Any]]]] = {}
+        self._lock_fd: Optional[int] = None
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._writes: List[Tuple[str, Optional[bytes], asyncio.Future]] = []
+        self._writes_ready: Optional[asyncio.Event] = None
+        self._closing = False
+        self._tasks: Set[asyncio.Task] = set()
+        self.delivered = 0
+        self.rejected = 0
+        self.retries = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    # OUTBOX FILES
+
+    def _claim_slot(self, directory: str):
+        self.events_path, self._lock_fd = claim_slot(lambda slot: os.path.join(directory, f"outbox-{slot}.jsonl"))
+        self.acked_path = self.events_path[:-len(".jsonl")] + ".acked"
+        self.accepted_path = self.events_path[:-len(".jsonl")] + ".accepted"
+
+    def _load(self):
+        acked = set()
+        if os.path.exists(self.acked_path):
+            with open(self.acked_path, "rb") as f:
+                acked = {line.strip().decode() for line in f if line.strip()}
+        if os.path.exists(self.events_path):
+            with open(self.events_path, "rb") as f:
+                for line in f:
+                    try:
+                        event = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue  # torn final line from a crash mid-write; it was never acknowledged to anyone
+                    result_id = event.get("result_id")
+                    if result_id and result_id not in acked and result_id not in self.pending:
+                        self.pending[result_id] = _Pending(event)
+        if os.path.exists(self.accepted_path):
+            with open(self.accepted_path, "rb") as f:
+                for line in f:
+                    try:
+                        job = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue  # torn: its 202 was never sent
+                    if job.get("job_id") not in acked:
+                        self._unfinished.append(job)
+
+    def _write(self, path: str, data: Optional[bytes]) -> asyncio.Future:
+        """Queue an append (a truncation when data is None); the future resolves once it is on disk"""
+        future = asyncio.get_running_loop().create_future()
+        self._writes.append((path, data, future))
+        self._writes_ready.set()
+        return future
+
+    async def _run_writer(self):
+        """Apply everything queued since the last round in one thread hop; exits once closing and drained"""
+        while True:
+            await self._writes_ready.wait()
+            self._writes_ready.clear()
+            writes, self._writes = self._writes, []
+            if writes:
+                try:
+                    await asyncio.to_thread(_apply_writes, [(path, data) for path, data, _ in writes])
+                except OSError as e:
+                    METRICS.incr("webhook_outbox_write_errors")
+                    print(f"❌ Webhook outbox write failed: {e}")
+                    for _, _, future in writes:
+                        future.set_exception(e)
+                else:
+                    for _, _, future in writes:
+                        future.set_result(None)
+            if self._closing:
+                await asyncio.sleep(0)  # let the resolved writes' callbacks queue their follow-up writes
+                if not self._writes:
+                    return
+
+    def _compact(self):
+        for path in (self.events_path, self.acked_path, self.accepted_path):
+            self._write(path, None)
+
+    def _ack(self, ids: List[str]):
+        """Acknowledge delivered result_ids or finished job_ids"""
+        for done_id in ids:
+            self.pending.pop(done_id, None)
+            self.jobs.pop(done_id, None)
+        if self.events_path is None:
+            return
+        if self.pending or self.jobs:
+            self._write(self.acked_path, "".join(f"{done_id}\n" for done_id in ids).encode())
+        else:
+            self._compact()
+
+    # LIFECYCLE
+
+    def start(self, directory: str):
+        if not self.enabled or self._sender is not None:
+            return
+        self._claim_slot(directory)
+        self._load()
+        import httpx  # deferred: importing httpx costs ~130ms, paid only when webhooks are enabled
+        self._client = httpx.AsyncClient(
+            timeout=WEBHOOK_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight),
+            headers={"Content-Type": "application/json", "User-Agent": "HashProof-Webhooks/1.0"}
+        )
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._writes_ready = asyncio.Event()
+        self._closing = False
+        self._writer = asyncio.create_task(self._run_writer())
+        if not self.pending and not self._unfinished:
+            self._compact()
+        self._sender = asyncio.create_task(self._run())
+        if self.pending:
+            print(f"🔁 Resuming webhook delivery of {len(self.pending)} pending results from {self.events_path}")
+            self._wakeup.set()
+        if self._unfinished:
+            print(f"🔁 Resuming {len(self._unfinished)} accepted gradings from {self.accepted_path}")
+        for job in self._unfinished:
+            self._resume(job)
+        self._unfinished = []
+
+    async def stop(self):
+        if self._sender is None:
+            return
+        self._sender.cancel()
+        try:
+            await self._sender
+        except asyncio.CancelledError:
+            pass
+        self._sender = None
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=WEBHOOK_DRAIN_SECONDS)
+        if self.jobs:
+            print(f"💾 {len(self.jobs)} accepted gradings left unfinished; they resume at the next start")
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
+        self._closing = True
+        self._writes_ready.set()
+        await self._writer
+        self._writer = None
+        await self._client.aclose()
+        self._client = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        self.events_path = self.acked_path = self.accepted_path = None
+        if self.pending:
+            print(f"💾 {len(self.pending)} results left in the webhook outbox for the next start")
+
+    # ENQUEUE
+
+    async def enqueue(self, test_data: StoredTest, result: Dict):
+        """Persist a graded result for delivery, returning once it is on disk; no-op when webhooks are disabled"""
+        written = self._enqueue(dict(result, event="grading.completed", type=test_data.type,
+                                     topic=test_data.topic, difficulty=test_data.difficulty, graded_at=time.time()))
+        if written is not None:
+            await written
+
+    def _enqueue(self, event: Dict) -> Optional[asyncio.Future]:
+        if self.events_path is None or event["result_id"] in self.pending:
+            return None
+        written = self._write(self.events_path, orjson.dumps(event) + b"\n")
+        self.pending[event["result_id"]] = _Pending(event)
+        METRICS.incr("webhook_enqueued")
+        self._wakeup.set()
+        return written
+
+    def resume_with(self, kind: str, prepare: Callable[[Dict], Callable[[], Awaitable[Any]]]):
+        """Register how to rebuild the grading of an accepted `kind` request (its `.dict()`) after a restart"""
+        self._resumers[kind] = prepare
+
+    async def run_detached(self, kind: str, request: Dict, idempotency_key: str, work: Callable[[], Awaitable[Any]]):
+        """Grade in the background for a caller that only wants the webhook; failures are delivered too.
+
+        Returns once the request is on disk: if this worker stops before the grading finishes, the next
+        start grades it again through the `kind` hook registered with resume_with().
+        """
+        job = {"job_id": str(uuid.uuid4()), "kind": kind, "idempotency_key": idempotency_key, "request": request}
+        if self.accepted_path is not None:
+            await self._write(self.accepted_path, orjson.dumps(job) + b"\n")
+        self._run_job(job, work)
+
+    def _resume(self, job: Dict):
+        prepare = self._resumers.get(job.get("kind"))
+
+        async def work():
+            if prepare is None:
+                raise RuntimeError(f"No resume hook for {job.get('kind')} gradings")
+            return await prepare(job["request"])()
+
+        METRICS.incr("webhook_detached_resumed")
+        self._run_job(job, work)
+
+    def _run_job(self, job: Dict, work: Callable[[], Awaitable[Any]]):
+        task = asyncio.ensure_future(work())
+        self.jobs[job["job_id"]] = job
+        self._tasks.add(task)
+
+        def done(task: asyncio.Task):
+            self._tasks.discard(task)
+            if task.cancelled():  # stopped: left unacknowledged, so the next start grades it again
+                self.jobs.pop(job["job_id"], None)
+                return
+            if task.exception() is None:  # the result was enqueued, durably, by the grading itself
+                self._ack([job["job_id"]])
+                return
+            error = task.exception()
+            METRICS.incr("webhook_detached_failures")
+            written = self._enqueue({
+                "event": "grading.failed",
+                "result_id": str(uuid.uuid4()),
+                "idempotency_key": job["idempotency_key"],
+                "student_id": job["request"].get("student_id"),
+                "test_id": job["request"].get("test_id"),
+                "error": getattr(error, "detail", None) or str(error),
+                "graded_at": time.time(),
+            })
+            if written is None:
+                self._ack([job["job_id"]])
+            else:  # finished only once the failure itself is on disk
+                written.add_done_callback(lambda w: w.exception() is None and self._ack([job["job_id"]]))
+
+        task.add_done_callback(done)
+
+    # DELIVERY
+
+    def _due(self, now: float) -> List[str]:
+        due = []
+        for result_id, item in self.pending.items():
+            if not item.in_flight and item.next_attempt <= now:
+                due.append(result_id)
+                if len(due) == self.batch_size:
+                    break
+        return due
+
+    def _next_due_in(self, now: float) -> Optional[float]:
+        waiting = [item.next_attempt for item in self.pending.values() if not item.in_flight]
+        return max(0.0, min(waiting) - now) if waiting else None
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = self._due(time.monotonic())
+                if 0 < len(batch) < self.batch_size and self.batch_wait > 0:
+                    await asyncio.sleep(self.batch_wait)  # let a burst of gradings share one request
+                    batch = self._due(time.monotonic())
+                if not batch:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self._next_due_in(time.monotonic()))
+                    except asyncio.TimeoutError:
+                        pass
+                    self._slots.release()
+                    continue
+            except BaseException:
+                self._slots.release()
+                raise
+            for result_id in batch:
+                self.pending[result_id].in_flight = True
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _signature(self, body: bytes) -> Dict[str, str]:
+        if not self.secret:
+            return {}
+        digest = hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+        return {"X-HashProof-Signature": f"sha256={digest}"}
+
+    async def _send(self, batch: List[str]):
+        import httpx
+        try:
+            body = orjson.dumps({"batch_id": str(uuid.uuid4()), "results": [self.pending[r].event for r in batch]})
+            self.batches += 1
+            METRICS.incr("webhook_batches")
+            try:
+                response = await self._client.post(self.url, content=body, headers=self._signature(body))
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in RETRYABLE_STATUS:
+                    self._retry(batch, e)
+                else:
+                    self._reject(batch, e)
+                return
+            except httpx.HTTPError as e:
+                self._retry(batch, e)
+                return
+
+            self._ack(batch)
+            self.delivered += len(batch)
+            METRICS.incr("webhook_delivered", len(batch))
+        finally:
+            for result_id in batch:
+                item = self.pending.get(result_id)
+                if item is not None:
+                    item.in_flight = False
+            self._slots.release()
+            self._wakeup.set()
+
+    def _retry(self, batch: List[str], error: Exception):
+        import httpx
+        self.retries += 1
+        self.last_error = f"HTTP {error.response.status_code}" if isinstance(error, httpx.HTTPStatusError) \
+            else f"{type(error).__name__}: {error}"
+        METRICS.incr("webhook_retries")
+        now = time.monotonic()
+        for result_id in batch:
+            item = self.pending[result_id]
+            item.next_attempt = now + backoff_delay(item.attempts, error)
+            item.attempts += 1
+        print(f"🔁 Webhook batch of {len(batch)} failed ({self.last_error}), retrying with backoff")
+
+    def _reject(self, batch: List[str], error: "httpx.HTTPStatusError"):
+        """The receiver refused the batch outright (4xx); keep it in a dead-letter file instead of retrying forever"""
+        self.rejected += len(batch)
+        self.last_error = f"HTTP {error.response.status_code}: {error.response.text[:200]}"
+        METRICS.incr("webhook_rejected", len(batch))
+        dead_letter = self.events_path[:-len(".jsonl")] + ".rejected.jsonl"
+        self._write(dead_letter, b"".join(orjson.dumps(self.pending[r].event) + b"\n" for r in batch))
+        self._ack(batch)
+        print(f"❌ Webhook receiver rejected {len(batch)} results ({self.last_error}); saved to {dead_letter}")
+
+    def status(self) -> Dict:
+        now = time.monotonic()
+        attempts = [item.attempts for item in self.pending.values()]
+        return {
+            "enabled": self.enabled,
+            "pending": len(self.pending),
+            "in_flight": sum(1 for item in self.pending.values() if item.in_flight),
+            "accepted_running": len(self.jobs),
+            "max_attempts_pending": max(attempts) if attempts else 0,
+            "next_retry_in_seconds": round(self._next_due_in(now), 2) if self.pending and self._sender else None,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+            "outbox": self.events_path,
+        }
+
+WEBHOOKS = WebhookOutbox()
+
+async def accept_for_webhook(kind: str, request: Any, idempotency_key: str,
+                             grading: Callable[[], Awaitable[Any]]) -> ORJSONResponse:
+    """202 response for a grade request with deliver_by_webhook, sent once the request is on disk; the grading
+    itself runs detached"""
+    if not WEBHOOKS.enabled:
+        raise HTTPException(status_code=400, detail="Webhook delivery is not configured (RESULT_WEBHOOK_URL)")
+    await WEBHOOKS.run_detached(kind, request.dict(), idempotency_key, grading)
+    return ORJSONResponse(
+        {"status": "accepted", "idempotency_key": idempotency_key, "test_id": request.test_id},
+        status_code=202
+    )